@@ -0,0 +1,103 @@
+"""Compares the memory and lookup costs of the findings representations before and after the compact findings store.
+
+The findings are parsed from a generated JSON response like the one of the findings service, once into
+`teamscale_client.data.Finding` objects in a list and once into a `FindingsStore` of `CompactFinding` objects. The
+generated findings are deterministic, so results can be compared between runs.
+
+Usage: python benchmarks/findings_store_benchmark.py [FINDINGS_COUNT] [PRECOMMIT_FINDINGS_COUNT]
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from teamscale_client.data import Finding
+
+from teamscale_precommit_client.http_client import PrecommitTeamscaleClient
+
+DEFAULT_FINDINGS_COUNT = 100000
+DEFAULT_PRECOMMIT_FINDINGS_COUNT = 1000
+# Numbers of distinct files and finding types among the generated findings.
+_FILES_COUNT = 2000
+_FINDING_TYPES_COUNT = 50
+
+
+def _get_findings_json(findings_count):
+    """Returns a findings service response with the given number of findings."""
+    return json.dumps([{
+        'id': 'finding-%i' % index,
+        'typeId': 'type-%i' % (index % _FINDING_TYPES_COUNT),
+        'message': 'Message of finding type %i' % (index % _FINDING_TYPES_COUNT),
+        'assessment': 'RED' if index % 3 == 0 else 'YELLOW',
+        'location': {'uniformPath': 'src/module%i/File%i.java' % (index % 20, index % _FILES_COUNT),
+                     'rawStartLine': index % 500 + 1, 'rawEndLine': index % 500 + 3,
+                     'rawStartOffset': index, 'rawEndOffset': index + 40}
+    } for index in range(findings_count)])
+
+
+def _parse_as_findings_list(findings_json):
+    """Parses the findings like the client did before the compact findings store."""
+    return [Finding(finding['typeId'], finding['message'], finding['assessment'],
+                    finding['location']['rawStartOffset'], finding['location']['rawEndOffset'],
+                    finding['location']['rawStartLine'], finding['location']['rawEndLine'],
+                    uniform_path=finding['location']['uniformPath'], finding_id=finding['id'])
+            for finding in json.loads(findings_json)]
+
+
+def _parse_as_findings_store(findings_json):
+    """Parses the findings like the client does now."""
+    client = PrecommitTeamscaleClient.__new__(PrecommitTeamscaleClient)
+    return client._findings_from_json(json.loads(findings_json))
+
+
+def _measure_memory(parse, findings_json):
+    """Returns the parsed findings and the number of bytes they retain."""
+    gc.collect()
+    tracemalloc.start()
+    findings = parse(findings_json)
+    gc.collect()
+    retained_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return findings, retained_bytes
+
+
+def _measure_removal_of_precommit_findings(existing_findings, precommit_findings):
+    """Returns the seconds needed to remove the precommit findings from the existing findings, as the client does
+    before printing existing findings."""
+    start = time.time()
+    remaining_findings = [finding for finding in existing_findings if finding not in precommit_findings]
+    elapsed = time.time() - start
+    assert len(remaining_findings) == len(existing_findings) - len(precommit_findings)
+    return elapsed
+
+
+def main():
+    findings_count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FINDINGS_COUNT
+    precommit_findings_count = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PRECOMMIT_FINDINGS_COUNT
+    findings_json = _get_findings_json(findings_count)
+    precommit_findings_json = _get_findings_json(precommit_findings_count)
+
+    findings_list, list_bytes = _measure_memory(_parse_as_findings_list, findings_json)
+    list_seconds = _measure_removal_of_precommit_findings(findings_list,
+                                                          _parse_as_findings_list(precommit_findings_json))
+    del findings_list
+    findings_store, store_bytes = _measure_memory(_parse_as_findings_store, findings_json)
+    store_seconds = _measure_removal_of_precommit_findings(findings_store,
+                                                           _parse_as_findings_store(precommit_findings_json))
+
+    print('%i findings, %i precommit findings' % (findings_count, precommit_findings_count))
+    print('%-16s %12s %28s' % ('', 'memory (MB)', 'precommit removal (seconds)'))
+    print('%-16s %12.1f %28.3f' % ('Finding list', list_bytes / 1024.0 / 1024, list_seconds))
+    print('%-16s %12.1f %28.3f' % ('FindingsStore', store_bytes / 1024.0 / 1024, store_seconds))
+
+
+if __name__ == '__main__':
+    main()
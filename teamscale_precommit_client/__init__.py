@@ -1,5 +1,6 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+from teamscale_precommit_client.data import PrecommitResult
 from teamscale_precommit_client.precommit_client import PrecommitClient
 
@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import collections
+
 from teamscale_client.utils import auto_str
 
 
@@ -17,3 +19,45 @@ class PreCommitUploadData(object):
         """
         self.uniformPathToContentMap = uniformPathToContentMap
         self.deletedUniformPaths = deletedUniformPaths
+
+
+@auto_str
+class PrecommitResult(object):
+    """Result of a precommit analysis, as returned by `PrecommitClient.analyze`."""
+
+    # The analysis ran to completion.
+    STATUS_COMPLETED = 'COMPLETED'
+    # There were no changes and no existing findings were requested, so nothing was analyzed.
+    STATUS_NO_CHANGES = 'NO_CHANGES'
+    # The deadline passed before all results were retrieved. The results are incomplete.
+    STATUS_DEADLINE_EXCEEDED = 'DEADLINE_EXCEEDED'
+    # A newer run started in the same repository. The results are incomplete.
+    STATUS_SUPERSEDED = 'SUPERSEDED'
+
+    def __init__(self):
+        """
+        Constructor.
+
+        Attributes:
+            status (str): One of the `STATUS_*` constants.
+            exit_code (int): The exit status the command-line client uses for this result.
+            findings (collections.OrderedDict[str, list]): The reported findings by section (e.g. 'New findings:'), in
+                                                           the order the sections were reported. Paths are relative to
+                                                           the repository, i.e. without path prefix. Sections that were
+                                                           not reported, e.g. precommit findings if there are no
+                                                           changes, are missing.
+            timings (collections.OrderedDict[str, float]): Seconds spent in each phase of the analysis.
+            uploaded_files (int): Number of changed files uploaded for precommit analysis.
+            uploaded_bytes (int): Size of the uploaded file contents in UTF-8.
+            deleted_files (int): Number of deleted files reported for precommit analysis.
+            skipped_files (collections.OrderedDict[str, str]): The reason why each changed file that is too large or
+                                                               not in the expected encoding was not uploaded, by path.
+        """
+        self.status = PrecommitResult.STATUS_COMPLETED
+        self.exit_code = 0
+        self.findings = collections.OrderedDict()
+        self.timings = collections.OrderedDict()
+        self.uploaded_files = 0
+        self.uploaded_bytes = 0
+        self.deleted_files = 0
+        self.skipped_files = collections.OrderedDict()
@@ -0,0 +1,121 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import json
+import os
+import re
+import time
+from configparser import ConfigParser
+
+# Connector options of the Teamscale project configuration holding the file patterns.
+_INCLUDED_FILES_OPTION = 'Included file names'
+_EXCLUDED_FILES_OPTION = 'Excluded file names'
+# Keys in the [project] section of the local configuration file holding the file patterns.
+_INCLUDED_FILES_CONFIG_KEY = 'included_files'
+_EXCLUDED_FILES_CONFIG_KEY = 'excluded_files'
+
+
+def _split_patterns(patterns):
+    """Splits a comma or newline separated list of patterns."""
+    return [pattern.strip() for pattern in re.split(r'[,\n]', patterns or '') if pattern.strip()]
+
+
+def _ant_pattern_to_regex(pattern):
+    """Converts an ant pattern into a regular expression matching whole paths. `**` matches any number of
+    directories, `*` any part of a file or directory name and `?` a single character of it."""
+    if pattern.endswith('/'):
+        # Ant treats a trailing slash like a trailing "**"
+        pattern += '**'
+    regex = ''
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith('**/', index):
+            regex += '(?:.*/)?'
+            index += 3
+        elif pattern.startswith('**', index):
+            regex += '.*'
+            index += 2
+        elif pattern[index] == '*':
+            regex += '[^/]*'
+            index += 1
+        elif pattern[index] == '?':
+            regex += '[^/]'
+            index += 1
+        else:
+            regex += re.escape(pattern[index])
+            index += 1
+    return re.compile(regex + r'\Z')
+
+
+class FilePatterns(object):
+    """Include and exclude patterns of the files analyzed by a Teamscale project.
+
+    A project may have several connectors with separate patterns. A file is analyzed if it is included and not
+    excluded by any of them. Without any connector patterns, all files are considered analyzed.
+    """
+
+    def __init__(self, pattern_sets):
+        """Constructor
+
+        Args:
+            pattern_sets (List[Tuple[List[str], List[str]]]): The included and excluded ant patterns of each
+                                                              connector. No included patterns include all files.
+        """
+        self.pattern_sets = [(list(included), list(excluded)) for included, excluded in pattern_sets]
+        self._compiled_pattern_sets = [([_ant_pattern_to_regex(pattern) for pattern in included],
+                                        [_ant_pattern_to_regex(pattern) for pattern in excluded])
+                                       for included, excluded in self.pattern_sets]
+
+    @staticmethod
+    def from_project_configuration(project_configuration):
+        """Reads the patterns from the connectors of the given project configuration JSON."""
+        pattern_sets = []
+        for connector in project_configuration.get('connectors') or []:
+            options = connector.get('options') or {}
+            pattern_sets.append((_split_patterns(options.get(_INCLUDED_FILES_OPTION)),
+                                 _split_patterns(options.get(_EXCLUDED_FILES_OPTION))))
+        return FilePatterns(pattern_sets)
+
+    @staticmethod
+    def from_config_file(config_file):
+        """Reads the patterns from the [project] section of the given client configuration file. Returns `None` if the
+        file does not define any."""
+        parser = ConfigParser()
+        parser.read(config_file)
+        included = parser.get('project', _INCLUDED_FILES_CONFIG_KEY, fallback=None)
+        excluded = parser.get('project', _EXCLUDED_FILES_CONFIG_KEY, fallback=None)
+        if included is None and excluded is None:
+            return None
+        return FilePatterns([(_split_patterns(included), _split_patterns(excluded))])
+
+    @staticmethod
+    def load(cache_file, project_key, max_age_in_seconds):
+        """Loads patterns cached by `save` for the given project. Returns `None` if there are none or they are older
+        than the given age."""
+        try:
+            with open(cache_file) as cache:
+                cached = json.load(cache)
+        except (IOError, OSError, ValueError):
+            return None
+        if cached.get('project') != project_key or cached.get('saved_at', 0) < time.time() - max_age_in_seconds:
+            return None
+        return FilePatterns(cached['pattern_sets'])
+
+    def save(self, cache_file, project_key):
+        """Caches the patterns of the given project in the given file."""
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(cache_file, 'w') as cache:
+            json.dump({'project': project_key, 'saved_at': time.time(), 'pattern_sets': self.pattern_sets}, cache)
+
+    def matches(self, path):
+        """Returns whether the file at the given path (relative to the repository) is analyzed."""
+        path = path.replace(os.sep, '/')
+        if not self._compiled_pattern_sets:
+            return True
+        for included, excluded in self._compiled_pattern_sets:
+            if (not included or any(pattern.match(path) for pattern in included)) \
+                    and not any(pattern.match(path) for pattern in excluded):
+                return True
+        return False
@@ -0,0 +1,66 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import os
+from io import open
+
+
+class FindingsHistory(object):
+    """The formatted findings printed by the previous run on one branch of a repository.
+
+    Findings are grouped into sections, e.g. new findings or existing findings in a file. Comparing the findings of
+    the current run against the previous run yields the findings that are new or resolved since then.
+    """
+
+    def __init__(self, history_file, previous_sections):
+        """Constructor
+
+        Args:
+            history_file (str): The file the findings of the current run are stored in.
+            previous_sections (dict[str, List[str]]): Formatted findings of the previous run by section.
+        """
+        self.history_file = history_file
+        self.previous_sections = previous_sections
+        self.current_sections = {}
+
+    @staticmethod
+    def load(state_dir, branch):
+        """Loads the findings history of the given branch from the client state directory. If there is no previous
+        run (or its history is unreadable), all findings of the current run are considered new."""
+        branch_hash = hashlib.sha1(branch.encode('utf-8')).hexdigest()
+        history_file = os.path.join(state_dir, 'findings-history-%s.json' % branch_hash)
+        previous_sections = {}
+        if os.path.isfile(history_file):
+            try:
+                with open(history_file, encoding='utf-8') as file:
+                    previous_sections = json.load(file)
+            except ValueError:
+                pass
+        return FindingsHistory(history_file, previous_sections)
+
+    def compare(self, section, formatted_findings):
+        """Records the formatted findings of the given section for the current run and compares them to the previous
+        run.
+
+        Returns:
+            A tuple consisting of the findings that are new and the findings that were resolved since the previous run.
+        """
+        self.current_sections[section] = formatted_findings
+        current = set(formatted_findings)
+        previous = self.previous_sections.get(section, [])
+        previous_set = set(previous)
+        new_findings = [finding for finding in formatted_findings if finding not in previous_set]
+        resolved_findings = [finding for finding in previous if finding not in current]
+        return new_findings, resolved_findings
+
+    def save(self):
+        """Stores the findings of the current run. Sections not printed in the current run are kept."""
+        sections = dict(self.previous_sections)
+        sections.update(self.current_sections)
+        history_dir = os.path.dirname(self.history_file)
+        if not os.path.isdir(history_dir):
+            os.makedirs(history_dir)
+        with open(self.history_file, 'w', encoding='utf-8') as file:
+            file.write(json.dumps(sections, ensure_ascii=False))
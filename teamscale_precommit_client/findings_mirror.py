@@ -0,0 +1,158 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from teamscale_precommit_client.findings_store import CompactFinding, FindingsStore
+
+# Name of the database file in the client state directory.
+_MIRROR_FILENAME = 'findings-mirror.sqlite'
+DEFAULT_MAX_MIRRORED_BRANCHES = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirrored_commits (
+    branch TEXT PRIMARY KEY,
+    commit_sha TEXT NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS findings (
+    branch TEXT NOT NULL,
+    uniform_path TEXT NOT NULL,
+    finding_id TEXT,
+    type_id TEXT,
+    message TEXT,
+    assessment TEXT,
+    start_offset INTEGER,
+    end_offset INTEGER,
+    start_line INTEGER,
+    end_line INTEGER,
+    category TEXT
+);
+CREATE INDEX IF NOT EXISTS findings_by_path ON findings (branch, uniform_path);
+CREATE TABLE IF NOT EXISTS running_syncs (
+    branch TEXT PRIMARY KEY,
+    commit_sha TEXT NOT NULL,
+    started_at REAL NOT NULL
+);
+"""
+
+_FINDING_COLUMNS = ('finding_id, type_id, message, assessment, start_offset, end_offset, start_line, end_line, '
+                    'uniform_path, category')
+
+
+class FindingsMirror(object):
+    """Local SQLite copy of all findings on a branch at a specific commit.
+
+    Existing findings rarely change between two runs of the client, so per-file queries can be answered from the
+    mirror instead of the server as long as the mirror matches the current commit and is not too old. Only the
+    findings of the most recently synced branches are kept, as each branch holds a copy of all findings of the project.
+    """
+
+    def __init__(self, database_file, max_branches=DEFAULT_MAX_MIRRORED_BRANCHES):
+        """Constructor
+
+        Args:
+            database_file (str): The SQLite database file. It is created if it does not exist.
+            max_branches (int): The number of most recently synced branches whose findings are kept.
+        """
+        self.database_file = database_file
+        self.max_branches = max_branches
+
+    @staticmethod
+    def for_repository(state_dir, max_branches=DEFAULT_MAX_MIRRORED_BRANCHES):
+        """Returns the mirror of the repository with the given client state directory."""
+        if not os.path.isdir(state_dir):
+            os.makedirs(state_dir)
+        return FindingsMirror(os.path.join(state_dir, _MIRROR_FILENAME), max_branches)
+
+    def is_fresh(self, branch, commit_sha, max_age_in_seconds):
+        """Returns whether the mirror contains the findings of the given branch at the given commit, synced at most
+        `max_age_in_seconds` ago."""
+        with closing(self._connect()) as connection:
+            row = connection.execute('SELECT commit_sha, synced_at FROM mirrored_commits WHERE branch = ?',
+                                     (branch,)).fetchone()
+        return row is not None and row[0] == commit_sha and row[1] >= time.time() - max_age_in_seconds
+
+    def claim_sync(self, branch, commit_sha, timeout_in_seconds):
+        """Claims the sync of the given branch at the given commit, so that concurrent runs do not all download the
+        same findings. Returns `False` if another sync of the same commit was claimed less than `timeout_in_seconds`
+        ago and may still be running."""
+        with closing(self._connect()) as connection:
+            # Locks the database before reading, so that only one of several concurrent runs claims the sync
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute('SELECT commit_sha, started_at FROM running_syncs WHERE branch = ?',
+                                     (branch,)).fetchone()
+            if row is not None and row[0] == commit_sha and row[1] >= time.time() - timeout_in_seconds:
+                connection.rollback()
+                return False
+            connection.execute('INSERT OR REPLACE INTO running_syncs (branch, commit_sha, started_at) VALUES (?, ?, ?)',
+                               (branch, commit_sha, time.time()))
+            connection.commit()
+        return True
+
+    def release_sync(self, branch, commit_sha):
+        """Releases the claim on the sync of the given branch at the given commit, e.g. after the sync failed."""
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute('DELETE FROM running_syncs WHERE branch = ? AND commit_sha = ?', (branch, commit_sha))
+
+    def get_findings(self, branch, uniform_path):
+        """Returns the mirrored findings of the given branch at the given uniform path, including findings in files
+        below it if it is a directory. An empty path matches all findings.
+
+        Returns:
+            FindingsStore: The findings.
+        """
+        query = 'SELECT %s FROM findings WHERE branch = ?' % _FINDING_COLUMNS
+        parameters = [branch]
+        if uniform_path:
+            directory = uniform_path.rstrip('/') + '/'
+            # All paths below the directory are in the range [directory, directory with '/' replaced by '0')
+            query += ' AND (uniform_path = ? OR (uniform_path >= ? AND uniform_path < ?))'
+            parameters += [uniform_path, directory, directory[:-1] + '0']
+        with closing(self._connect()) as connection:
+            return FindingsStore(CompactFinding(finding_type_id=row[1], message=row[2], assessment=row[3],
+                                                start_offset=row[4], end_offset=row[5], start_line=row[6],
+                                                end_line=row[7], uniform_path=row[8], finding_id=row[0],
+                                                category=row[9])
+                                 for row in connection.execute(query, parameters))
+
+    def replace_findings(self, branch, commit_sha, findings):
+        """Replaces the mirrored findings of the given branch with the given findings at the given commit. The findings
+        are inserted while they are iterated, in a single transaction, so readers never see a partial mirror. The
+        findings of branches beyond the `max_branches` most recently synced ones are dropped.
+
+        Args:
+            findings (Iterable[CompactFinding]): The findings, e.g. streamed from the server.
+        """
+        rows = ((branch, finding.uniformPath, finding.finding_id, finding.findingTypeId, finding.message,
+                 finding.assessment, finding.startOffset, finding.endOffset, finding.startLine, finding.endLine,
+                 finding.category) for finding in findings)
+        with closing(self._connect()) as connection:
+            with connection:
+                connection.execute('DELETE FROM findings WHERE branch = ?', (branch,))
+                connection.executemany('INSERT INTO findings (branch, uniform_path, finding_id, type_id, message, '
+                                       'assessment, start_offset, end_offset, start_line, end_line, category) '
+                                       'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                connection.execute('INSERT OR REPLACE INTO mirrored_commits (branch, commit_sha, synced_at) '
+                                   'VALUES (?, ?, ?)', (branch, commit_sha, time.time()))
+                connection.execute('DELETE FROM running_syncs WHERE branch = ? AND commit_sha = ?', (branch, commit_sha))
+                self._drop_least_recently_synced_branches(connection)
+
+    def _drop_least_recently_synced_branches(self, connection):
+        """Drops the findings of all branches but the `max_branches` most recently synced ones."""
+        dropped_branches = connection.execute('SELECT branch FROM mirrored_commits ORDER BY synced_at DESC, rowid DESC '
+                                              'LIMIT -1 OFFSET ?', (self.max_branches,)).fetchall()
+        for dropped_branch, in dropped_branches:
+            connection.execute('DELETE FROM findings WHERE branch = ?', (dropped_branch,))
+            connection.execute('DELETE FROM mirrored_commits WHERE branch = ?', (dropped_branch,))
+
+    def _connect(self):
+        """Opens a new connection to the mirror, creating the schema if needed. Connections must not be shared
+        between threads."""
+        connection = sqlite3.connect(self.database_file, timeout=10)
+        connection.executescript(_SCHEMA)
+        return connection
@@ -0,0 +1,131 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import sys
+
+try:
+    _intern = sys.intern
+except AttributeError:
+    # Python 2
+    _intern = intern
+
+
+def _intern_or_none(string):
+    """Interns the given string, so that equal strings share memory. `None` is returned as is."""
+    return _intern(string) if string is not None else None
+
+
+class CompactFinding(object):
+    """Memory efficient representation of a finding retrieved from Teamscale.
+
+    Provides the attributes of `teamscale_client.data.Finding` used by the precommit client, but uses slots instead of
+    an instance dictionary and interns strings that are shared between many findings (paths, messages, types).
+    """
+
+    __slots__ = ('findingTypeId', 'message', 'assessment', 'startOffset', 'endOffset', 'startLine', 'endLine',
+                 'identifier', 'uniformPath', 'finding_id', 'category')
+
+    def __init__(self, finding_type_id, message, assessment, start_offset=None, end_offset=None, start_line=None,
+                 end_line=None, identifier=None, uniform_path=None, finding_id=None, category=None):
+        self.findingTypeId = _intern_or_none(finding_type_id)
+        self.message = _intern_or_none(message)
+        self.assessment = _intern_or_none(assessment)
+        self.startOffset = start_offset
+        self.endOffset = end_offset
+        self.startLine = start_line
+        self.endLine = end_line
+        self.identifier = identifier
+        self.uniformPath = _intern_or_none(uniform_path)
+        self.finding_id = finding_id
+        self.category = _intern_or_none(category)
+
+    def with_uniform_path(self, uniform_path):
+        """Returns a copy of this finding located at the given uniform path."""
+        return CompactFinding(self.findingTypeId, self.message, self.assessment, self.startOffset, self.endOffset,
+                              self.startLine, self.endLine, self.identifier, uniform_path, self.finding_id,
+                              self.category)
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in CompactFinding.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(CompactFinding.__slots__, state):
+            setattr(self, slot, value)
+
+    def __eq__(self, other):
+        """Checks if this finding is equal to the given finding. Like `teamscale_client.data.Finding`, findings are
+        compared by id if both have one."""
+        if self.finding_id and other.finding_id:
+            return self.finding_id == other.finding_id
+        return ((self.uniformPath, self.startLine, self.assessment, self.message, self.endLine, self.endOffset,
+                 self.findingTypeId, self.identifier, self.startOffset) ==
+                (other.uniformPath, other.startLine, other.assessment, other.message, other.endLine, other.endOffset,
+                 other.findingTypeId, other.identifier, other.startOffset))
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    # Equality is partly based on ids and partly on contents, so there is no consistent hash
+    __hash__ = None
+
+    def __lt__(self, other):
+        return (self.uniformPath, self.startLine, self.endLine) < (other.uniformPath, other.startLine, other.endLine)
+
+    def __repr__(self):
+        return 'CompactFinding(%s)' % ', '.join('%s=%s' % (slot, getattr(self, slot))
+                                                 for slot in CompactFinding.__slots__)
+
+
+class FindingsStore(object):
+    """Collection of findings that keeps them in insertion order and indexes them by uniform path, id and assessment.
+
+    Membership tests use the indices instead of comparing against every finding in the store.
+    """
+
+    def __init__(self, findings=()):
+        """Constructor
+
+        Args:
+            findings (Iterable[CompactFinding]): The initial findings.
+        """
+        self._findings = []
+        self._findings_by_path = {}
+        self._finding_ids = set()
+        self._assessment_counts = {}
+        self.extend(findings)
+
+    def add(self, finding):
+        """Adds the given finding."""
+        self._findings.append(finding)
+        self._findings_by_path.setdefault(finding.uniformPath, []).append(finding)
+        if finding.finding_id:
+            self._finding_ids.add(finding.finding_id)
+        self._assessment_counts[finding.assessment] = self._assessment_counts.get(finding.assessment, 0) + 1
+
+    def extend(self, findings):
+        """Adds all given findings."""
+        for finding in findings:
+            self.add(finding)
+
+    def has_assessment(self, assessment):
+        """Returns whether the store contains at least one finding with the given assessment."""
+        return self._assessment_counts.get(assessment, 0) > 0
+
+    def __contains__(self, finding):
+        """Checks whether an equal finding is in the store, using the same notion of equality as `CompactFinding`."""
+        if finding.finding_id and finding.finding_id in self._finding_ids:
+            return True
+        # Findings without a common id are only equal if they are at the same path
+        return any(candidate == finding for candidate in self._findings_by_path.get(finding.uniformPath, [])
+                   if not (candidate.finding_id and finding.finding_id))
+
+    def __iter__(self):
+        return iter(self._findings)
+
+    def __len__(self):
+        return len(self._findings)
+
+    def __bool__(self):
+        return len(self._findings) > 0
+
+    __nonzero__ = __bool__
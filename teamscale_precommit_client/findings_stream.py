@@ -0,0 +1,118 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import codecs
+import heapq
+import json
+import os
+import pickle
+import tempfile
+
+# Number of items sorted in memory at once by `sort_externally`. Larger inputs are sorted in runs on disk.
+DEFAULT_SORTING_RUN_SIZE = 10000
+
+
+def iter_json_array(chunks, encoding='utf-8'):
+    """Incrementally decodes a JSON array from the given chunks of bytes and yields its elements one by one.
+    Only the currently decoded element and the undecoded rest of the current chunk are kept in memory.
+
+        Args:
+            chunks (Iterable[bytes]): The encoded JSON array, split into arbitrary chunks
+            encoding (str): The encoding of the chunks
+
+        Returns:
+            Iterator: The decoded elements of the array.
+
+        Raises:
+            ValueError: If the chunks do not form a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    buffer = ''
+    position = 0
+    array_started = False
+    chunks = iter(chunks)
+    while True:
+        position = _skip_whitespace_and_commas(buffer, position, skip_commas=array_started)
+        if position < len(buffer):
+            if not array_started:
+                if buffer[position] != '[':
+                    raise ValueError('Expected a JSON array, but got: %s' % buffer[position:position + 20])
+                array_started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                element, position = decoder.raw_decode(buffer, position)
+                yield element
+                continue
+            except ValueError:
+                # The element is incomplete, so more data is needed
+                pass
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError('Unexpected end of JSON array')
+        buffer = buffer[position:] + text_decoder.decode(chunk)
+        position = 0
+
+
+def _skip_whitespace_and_commas(buffer, position, skip_commas):
+    """Returns the position of the first character in the buffer that is neither whitespace nor (optionally) a
+    comma."""
+    while position < len(buffer) and (buffer[position].isspace() or (skip_commas and buffer[position] == ',')):
+        position += 1
+    return position
+
+
+def sort_externally(items, key, run_size=DEFAULT_SORTING_RUN_SIZE):
+    """Sorts the given items while keeping at most `run_size` of them in memory. Sorted runs are spilled to
+    temporary files and lazily merged.
+
+        Args:
+            items (Iterable): The items to sort. They must be picklable.
+            key (function): Returns the sort key of an item.
+            run_size (int): The maximum number of items sorted in memory at once.
+
+        Returns:
+            Iterator: The sorted items.
+    """
+    run_files = []
+    try:
+        run = []
+        for item in items:
+            run.append(item)
+            if len(run) >= run_size:
+                run_files.append(_write_sorted_run(run, key))
+                run = []
+        run.sort(key=key)
+        if not run_files:
+            for item in run:
+                yield item
+            return
+        runs = [_read_run(run_file) for run_file in run_files] + [iter(run)]
+        for item in heapq.merge(*runs, key=key):
+            yield item
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+
+def _write_sorted_run(run, key):
+    """Sorts the given run and writes it to a temporary file that is deleted once closed."""
+    run.sort(key=key)
+    run_file = tempfile.TemporaryFile()
+    for item in run:
+        pickle.dump(item, run_file, protocol=pickle.HIGHEST_PROTOCOL)
+    run_file.seek(0, os.SEEK_SET)
+    return run_file
+
+
+def _read_run(run_file):
+    """Yields the items of a run written by `_write_sorted_run`."""
+    while True:
+        try:
+            yield pickle.load(run_file)
+        except EOFError:
+            return
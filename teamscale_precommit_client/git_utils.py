@@ -4,6 +4,8 @@ from __future__ import unicode_literals
 
 import locale
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from io import open
 
 from git import Repo, InvalidGitRepositoryError, Diffable
@@ -12,6 +14,28 @@ from git import Repo, InvalidGitRepositoryError, Diffable
 # https://gitpython.readthedocs.io/en/stable/reference.html#git.diff.DiffIndex, but testing it locally gave R092)
 _CHANGE_TYPES_CONSIDERED_FOR_PRECOMMIT = ['M', 'A', 'C', 'T', 'R', 'R092']
 _CHANGE_TYPE_DELETED = 'D'
+# Name of the directory inside the git directory where the client keeps state between runs.
+_CLIENT_STATE_DIR_NAME = 'teamscale-cli'
+# Files larger than this are not uploaded for precommit analysis.
+_MAX_FILE_SIZE_IN_BYTES = 1 * 1024 * 1024
+# Mode of index entries that point to submodule commits instead of blobs.
+_SUBMODULE_MODE = '160000'
+
+# Repository handles by absolute path. They are reused by all calls, so that long-running processes do not reopen the
+# repository (and restart its `git cat-file` processes) for every analysis.
+_repositories = {}
+_repositories_lock = threading.Lock()
+
+
+def _get_repo(path_to_repository):
+    """Returns the shared handle of the Git repository at the given path, opening it on first use."""
+    key = os.path.abspath(path_to_repository)
+    with _repositories_lock:
+        repo = _repositories.get(key)
+        if repo is None:
+            repo = _repositories[key] = Repo(path_to_repository)
+    return repo
+
 
 def get_current_branch(path_to_repository):
     """Utility method for getting the current branch from a Git repository.
@@ -22,7 +46,7 @@ def get_current_branch(path_to_repository):
         Returns:
             str: The current branch in the provided repository.
     """
-    repo = Repo(path_to_repository)
+    repo = _get_repo(path_to_repository)
     return repo.active_branch.name
 
 
@@ -35,7 +59,19 @@ def get_current_commit_sha(path_to_repository):
         Returns:
             str: SHA of current commit.
     """
-    return Repo(path_to_repository).active_branch.commit.hexsha
+    return _get_repo(path_to_repository).active_branch.commit.hexsha
+
+
+def get_client_state_dir(path_to_repository):
+    """Get the directory in which the client keeps state between runs for the given repository.
+
+        Args:
+            path_to_repository (str): Path to the Git repository
+
+        Returns:
+            str: Path of a directory inside the repository's git directory. It may not exist yet.
+    """
+    return os.path.join(_get_repo(path_to_repository).git_dir, _CLIENT_STATE_DIR_NAME)
 
 
 def get_repo_root_from_file_in_repo(path_to_file_in_repo):
@@ -62,36 +98,34 @@ def get_current_timestamp(path_to_repository):
         Returns:
             str: The timestamp of the last commit in the provided repository.
     """
-    repo = Repo(path_to_repository)
+    repo = _get_repo(path_to_repository)
     return repo.head.commit.committed_date
 
 
-def filter_changed_files(changed_files, path_to_repository, file_encoding):
+def filter_changed_files(changed_files, path_to_repository, file_encoding, path_filter=None, on_skipped_file=None):
     """Filters the provided list of changed files.
 
-    Non UTF-8 files and files larger than 1 MB are ignored.
+    Non UTF-8 files and files larger than 1 MB are ignored. If a path filter is given, files it rejects are ignored
+    without reading them. Ignored files that cannot be analyzed are reported to `on_skipped_file` with the reason, or
+    printed if it is not given.
     """
     filtered_files = []
     for changed_file in changed_files:
+        if path_filter is not None and not path_filter(changed_file):
+            continue
         file_is_valid = True
         if (os.path.isdir(os.path.join(path_to_repository, changed_file))):
             #ignore directories (e.g., git submodule folders)
             continue
-        if os.path.getsize(os.path.join(path_to_repository, changed_file)) > 1 * 1024 * 1024:
-            print('File too large for precommit analysis. Ignoring: %s' % changed_file)
+        if os.path.getsize(os.path.join(path_to_repository, changed_file)) > _MAX_FILE_SIZE_IN_BYTES:
+            _report_skipped_file(on_skipped_file, changed_file, _get_file_too_large_message(changed_file))
             file_is_valid = False
 
         try:
             with open(os.path.join(path_to_repository, changed_file), encoding=file_encoding) as file:
                 file.read()
         except UnicodeDecodeError:
-            encoding_string = file_encoding
-            if encoding_string is None:
-                encoding_string = locale.getpreferredencoding() + ' (system encoding)'
-
-            print(
-                'File at %s is not encoded in %s. Try using the --file-encoding option.' % (
-                    changed_file, encoding_string))
+            _report_skipped_file(on_skipped_file, changed_file, _get_wrong_encoding_message(changed_file, file_encoding))
             file_is_valid = False
 
         if file_is_valid:
@@ -100,7 +134,90 @@ def filter_changed_files(changed_files, path_to_repository, file_encoding):
     return filtered_files
 
 
-def get_changed_files_and_content(path_to_repository, file_encoding, ignore_subrepositories):
+def _report_skipped_file(on_skipped_file, changed_file, reason):
+    """Reports a changed file that is skipped for the given reason to the given callback, or prints the reason if there
+    is no callback."""
+    if on_skipped_file is None:
+        print(reason)
+    else:
+        on_skipped_file(changed_file, reason)
+
+
+def _get_file_too_large_message(changed_file):
+    return 'File too large for precommit analysis. Ignoring: %s' % changed_file
+
+
+def _get_wrong_encoding_message(changed_file, file_encoding):
+    encoding_string = file_encoding
+    if encoding_string is None:
+        encoding_string = locale.getpreferredencoding() + ' (system encoding)'
+
+    return 'File at %s is not encoded in %s. Try using the --file-encoding option.' % (changed_file, encoding_string)
+
+
+def get_staged_changes(path_to_repository, file_encoding, ignore_subrepositories, path_filter=None,
+                       on_skipped_file=None):
+    """Utility method for getting the staged changes from a Git repository, e.g. in a pre-commit hook.
+
+    In contrast to `get_changed_files_and_content`, the content is read from the blobs in the index instead of the
+    working tree. All blobs are read through a single long-running `git cat-file --batch` process. Files are filtered
+    like in `filter_changed_files`.
+
+        Args:
+            path_to_repository (str): Path to the Git repository
+            file_encoding (str): Encoding of the files in the repository (c.f. https://docs.python.org/3/library/codecs.html#standard-encodings)
+            ignore_subrepositories (bool): Whether to ignore changes in git submodules
+            path_filter (Callable[[str], bool]): If given, only changed files whose path it accepts are read
+            on_skipped_file (Callable[[str, str], None]): If given, called with the path and the reason of every
+                                                          changed file that is too large or wrongly encoded
+
+        Returns:
+            tuple: Mapping of filename to staged content for all changed files and the list of deleted files.
+    """
+    repo = _get_repo(path_to_repository)
+    arguments = ['--cached', '-z', '--no-renames']
+    if ignore_subrepositories:
+        arguments.append('--ignore-submodules=all')
+    raw_diff = repo.git.diff_index(*(arguments + ['HEAD']))
+
+    encoding = file_encoding or locale.getpreferredencoding(False)
+    changed_files = {}
+    deleted_files = []
+    # The output consists of alternating NUL-terminated entries ":<old mode> <new mode> <old sha> <new sha> <status>"
+    # and paths
+    entries = raw_diff.split('\0')
+    for metadata, path in zip(entries[0::2], entries[1::2]):
+        _, new_mode, _, new_sha, status = metadata.lstrip(':').split(' ')
+        if status == _CHANGE_TYPE_DELETED:
+            deleted_files.append(path)
+        elif status in _CHANGE_TYPES_CONSIDERED_FOR_PRECOMMIT and new_mode != _SUBMODULE_MODE \
+                and (path_filter is None or path_filter(path)):
+            content = _read_staged_blob(repo, new_sha, path, encoding, file_encoding, on_skipped_file)
+            if content is not None:
+                changed_files[path] = content
+    return changed_files, deleted_files
+
+
+def _read_staged_blob(repo, sha, path, encoding, file_encoding, on_skipped_file):
+    """Reads and decodes the given blob. Returns `None` if the blob is too large or not in the expected encoding."""
+    _, _, size, stream = repo.git.stream_object_data(sha)
+    if size > _MAX_FILE_SIZE_IN_BYTES:
+        _report_skipped_file(on_skipped_file, path, _get_file_too_large_message(path))
+        # Deleting the stream skips the rest of the blob in the pipe
+        del stream
+        return None
+    data = stream.read(size)
+    try:
+        content = data.decode(encoding)
+    except UnicodeDecodeError:
+        _report_skipped_file(on_skipped_file, path, _get_wrong_encoding_message(path, file_encoding))
+        return None
+    # Like reading a file in text mode, use universal newlines
+    return content.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def get_changed_files_and_content(path_to_repository, file_encoding, ignore_subrepositories, path_filter=None,
+                                  on_skipped_file=None):
     """Utility method for getting the currently changed files from a Git repository.
 
     Filters the changed files using `filter_changed_files`.
@@ -108,13 +225,16 @@ def get_changed_files_and_content(path_to_repository, file_encoding, ignore_subr
         Args:
             path_to_repository (str): Path to the Git repository
             file_encoding (str): Encoding of the files in the repository (c.f. https://docs.python.org/3/library/codecs.html#standard-encodings)
+            path_filter (Callable[[str], bool]): If given, only changed files whose path it accepts are read
+            on_skipped_file (Callable[[str, str], None]): If given, called with the path and the reason of every
+                                                          changed file that is too large or wrongly encoded
 
         Returns:
             dict: Mapping of filename to file content for all changed files in the provided repository.
             :param ignore_subrepositories:
     """
     changed_files = filter_changed_files(get_changed_files(path_to_repository, ignore_subrepositories),
-                                         path_to_repository, file_encoding)
+                                         path_to_repository, file_encoding, path_filter, on_skipped_file)
     return {filename: open(os.path.join(path_to_repository, filename), encoding=file_encoding).read() for filename in
             changed_files}
 
@@ -154,7 +274,7 @@ def _get_diff_to_last_commit(path_to_repository, ignore_subrepositories):
         Returns:
             List(git.diff.Diff): List of Diff objects for every file
     """
-    repo = Repo(path_to_repository)
+    repo = _get_repo(path_to_repository)
     if ignore_subrepositories==True:
         unstaged_diff = repo.index.diff(other=None, paths=None, create_patch=False, ignore_submodules="all")
         staged_diff = repo.head.commit.diff(other=Diffable.Index, paths=None, create_patch=False, ignore_submodules="all")
@@ -163,3 +283,88 @@ def _get_diff_to_last_commit(path_to_repository, ignore_subrepositories):
         staged_diff = repo.head.commit.diff(other=Diffable.Index, paths=None, create_patch=False)
 
     return unstaged_diff + staged_diff
+
+
+def get_submodule_paths(path_to_repository):
+    """Utility method for getting the initialized submodules of a Git repository, without nested submodules.
+
+    The submodules are read from the gitlinks in the index, which does not touch the submodules themselves.
+
+        Args:
+            path_to_repository (str): Path to the Git repository
+
+        Returns:
+            List(str): Paths of the submodules relative to the given repository.
+    """
+    index = _get_repo(path_to_repository).git.ls_files('--stage', '-z')
+    submodule_paths = []
+    # Each entry has the form "<mode> <sha> <stage>\t<path>"
+    for entry in index.split('\0'):
+        if not entry.startswith(_SUBMODULE_MODE + ' '):
+            continue
+        path = entry.split('\t', 1)[1]
+        # Submodules that are not initialized have no git directory (or file pointing to it)
+        if os.path.exists(os.path.join(path_to_repository, path, '.git')):
+            submodule_paths.append(path)
+    return submodule_paths
+
+
+def get_changes_in_subrepositories(path_to_repository, file_encoding, max_workers, staged_only=False,
+                                   path_filter=None, on_skipped_file=None):
+    """Utility method for getting the changed and deleted files in all submodules of a Git repository.
+
+    The submodules are examined concurrently. Nested submodules are listed by the worker examining their parent, so
+    that no submodule waits for the submodules before it. Paths are relative to the given repository, i.e. prefixed with
+    the location of the submodule.
+
+        Args:
+            path_to_repository (str): Path to the Git repository
+            file_encoding (str): Encoding of the files in the repository (c.f. https://docs.python.org/3/library/codecs.html#standard-encodings)
+            max_workers (int): Maximum number of submodules examined at the same time
+            staged_only (bool): Whether to only consider staged changes (see `get_staged_changes`)
+            path_filter (Callable[[str], bool]): If given, only changed files whose path (relative to the given
+                                                 repository) it accepts are read
+            on_skipped_file (Callable[[str, str], None]): If given, called with the path (relative to the given
+                                                          repository) and the reason of every changed file that is too
+                                                          large or wrongly encoded
+
+        Returns:
+            tuple: Mapping of filename to content for all changed files and the list of deleted files.
+    """
+    submodule_paths = get_submodule_paths(path_to_repository)
+    if not submodule_paths:
+        return {}, []
+
+    def get_changes_in_submodule(submodule_path):
+        """Returns the changed and deleted files in the given submodule and the paths of its nested submodules."""
+        path_to_submodule = os.path.join(path_to_repository, submodule_path)
+        prefix = submodule_path.rstrip('/') + '/'
+        submodule_path_filter = None
+        if path_filter is not None:
+            submodule_path_filter = lambda path: path_filter(prefix + path)
+        on_skipped_submodule_file = None
+        if on_skipped_file is not None:
+            on_skipped_submodule_file = lambda path, reason: on_skipped_file(prefix + path, reason)
+        if staged_only:
+            changed_files, deleted_files = get_staged_changes(path_to_submodule, file_encoding, True,
+                                                              submodule_path_filter, on_skipped_submodule_file)
+        else:
+            changed_files = get_changed_files_and_content(path_to_submodule, file_encoding, True,
+                                                          submodule_path_filter, on_skipped_submodule_file)
+            deleted_files = get_deleted_files(path_to_submodule, True)
+        return ({prefix + path: content for path, content in changed_files.items()},
+                [prefix + path for path in deleted_files],
+                [prefix + path for path in get_submodule_paths(path_to_submodule)])
+
+    all_changed_files = {}
+    all_deleted_files = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set(executor.submit(get_changes_in_submodule, path) for path in submodule_paths)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                changed_files, deleted_files, nested_submodule_paths = future.result()
+                all_changed_files.update(changed_files)
+                all_deleted_files.extend(deleted_files)
+                pending.update(executor.submit(get_changes_in_submodule, path) for path in nested_submodule_paths)
+    return all_changed_files, sorted(all_deleted_files)
@@ -0,0 +1,523 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import collections
+import math
+import queue
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from teamscale_client import TeamscaleClient
+from teamscale_client.data import ServiceError
+
+from teamscale_precommit_client.findings_store import CompactFinding, FindingsStore
+from teamscale_precommit_client.findings_stream import iter_json_array
+from teamscale_precommit_client.response_cache import ResponseCache, has_validators
+
+DEFAULT_CONNECT_TIMEOUT_IN_SECONDS = 5.0
+DEFAULT_READ_TIMEOUT_IN_SECONDS = 30.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_MAX_CONCURRENT_REQUESTS = 1
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the overall deadline of the client has passed before a request could be completed."""
+
+
+class PrecommitTeamscaleClient(TeamscaleClient):
+    """Teamscale client that bounds the time spent on server requests.
+
+    All requests share one HTTP session and use separate connect and read timeouts. Idempotent GET requests are
+    retried with jittered exponential backoff. If a hedging percentile is given, a duplicate GET request is sent
+    once the pending one takes longer than that percentile of the latencies observed so far; the first response
+    wins. If a deadline is set, no request or wait extends beyond it and `DeadlineExceededError` is raised instead.
+    If a cancellation check is set, it is called before every request and regularly while waiting; it cancels the
+    current operation by raising an exception.
+
+    If a response cache is set, responses of the cached services are revalidated with conditional requests instead of
+    being downloaded again. Findings retrieved for a revision are revalidated as well if the server supports it.
+    Otherwise, as the revision identifies them, they are served from the cache without any request. The commit of a
+    revision never changes once the server knows it, so it is served from the cache as well.
+    """
+
+    # Status codes of GET responses that indicate a transient server problem worth retrying.
+    RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+    # Backoff before the first retry. Doubles with every further retry up to the cap.
+    RETRY_BACKOFF_BASE_IN_SECONDS = 0.5
+    RETRY_BACKOFF_CAP_IN_SECONDS = 8.0
+    # Number of latency samples required before the hedging threshold is considered meaningful.
+    HEDGING_MIN_SAMPLES = 5
+    # Number of most recent latency samples the hedging threshold is computed from.
+    HEDGING_MAX_SAMPLES = 100
+    # Number of seconds between two polls for precommit analysis results.
+    POLLING_INTERVAL_IN_SECONDS = 2
+    # Number of bytes read at once from streamed responses.
+    STREAMING_CHUNK_SIZE = 64 * 1024
+    # Number of seconds between two cancellation checks while waiting.
+    CANCELLATION_CHECK_INTERVAL_IN_SECONDS = 0.2
+    # Services whose GET responses are cached if a response cache is set.
+    CACHED_SERVICES = ('findings',)
+
+    def __init__(self, url, username, access_token, project, sslverify=True,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT_IN_SECONDS, read_timeout=DEFAULT_READ_TIMEOUT_IN_SECONDS,
+                 max_retries=DEFAULT_MAX_RETRIES, hedging_percentile=None, branch=None, transport_adapter=None,
+                 max_concurrent_requests=DEFAULT_MAX_CONCURRENT_REQUESTS):
+        """Constructor
+
+        Args:
+            connect_timeout (float): Seconds to wait for a connection to the server to be established.
+            read_timeout (float): Seconds to wait for the server to send data once connected.
+            max_retries (int): How often a failed GET request is retried.
+            hedging_percentile (float): Latency percentile (0-100) after which a duplicate GET request is sent.
+                                        `None` disables hedging.
+            transport_adapter (requests.adapters.BaseAdapter): If given, sends all requests instead of the default
+                                                               adapter, e.g. to record or replay them. It should keep
+                                                               `get_connection_pool_size` connections.
+            max_concurrent_requests (int): Number of threads that may send GET requests at the same time.
+        """
+        self.session = requests.Session()
+        if transport_adapter is None:
+            transport_adapter = HTTPAdapter(
+                pool_maxsize=PrecommitTeamscaleClient.get_connection_pool_size(max_concurrent_requests))
+        self.session.mount('http://', transport_adapter)
+        self.session.mount('https://', transport_adapter)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.hedging_percentile = hedging_percentile
+        self.deadline = None
+        self.cancellation_check = None
+        self.latencies = collections.deque(maxlen=PrecommitTeamscaleClient.HEDGING_MAX_SAMPLES)
+        self.request_count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._request_statistics_lock = threading.Lock()
+        self.max_concurrent_requests = max_concurrent_requests
+        self.response_cache = None
+        self._commits_by_revision = {}
+        super(PrecommitTeamscaleClient, self).__init__(url, username, access_token, project, sslverify,
+                                                       read_timeout, branch)
+
+    @staticmethod
+    def get_connection_pool_size(max_concurrent_requests):
+        """Returns the number of connections to keep open for the given number of threads sending GET requests at
+        the same time: one for each request and one for its hedged duplicate."""
+        return 2 * max_concurrent_requests
+
+    def reset_request_statistics(self):
+        """Resets the number and latencies of the GET requests counted so far, e.g. before a new run. The latencies
+        the hedging threshold is computed from are kept."""
+        with self._request_statistics_lock:
+            self.request_count = 0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+
+    def set_deadline(self, seconds):
+        """Sets the overall deadline to the given number of seconds from now. `None` removes the deadline."""
+        self.deadline = time.time() + seconds if seconds is not None else None
+
+    def get_remaining_time(self):
+        """Returns the number of seconds until the deadline or `None` if there is no deadline.
+
+        Raises:
+            DeadlineExceededError: If the deadline has already passed.
+        """
+        if self.deadline is None:
+            return None
+        remaining = self.deadline - time.time()
+        if remaining <= 0:
+            raise DeadlineExceededError()
+        return remaining
+
+    def wait(self, seconds):
+        """Sleeps for the given number of seconds, but raises `DeadlineExceededError` if the deadline passes. If a
+        cancellation check is set, it is called regularly while sleeping."""
+        end = time.time() + seconds
+        while True:
+            self._check_cancellation()
+            remaining = self.get_remaining_time()
+            seconds_left = end - time.time()
+            if seconds_left <= 0:
+                return
+            if self.cancellation_check is not None:
+                seconds_left = min(seconds_left, PrecommitTeamscaleClient.CANCELLATION_CHECK_INTERVAL_IN_SECONDS)
+            if remaining is not None and remaining < seconds_left:
+                time.sleep(remaining)
+                raise DeadlineExceededError()
+            time.sleep(seconds_left)
+
+    def _check_cancellation(self):
+        """Calls the cancellation check, if any."""
+        if self.cancellation_check is not None:
+            self.cancellation_check()
+
+    def get(self, url, parameters=None, stream=False):
+        """Sends a GET request to the given service url. Transient failures are retried.
+
+        Args:
+            url (str):  The URL for which to execute a GET request
+            parameters (dict): parameters to attach to the url
+            stream (bool): Whether to defer downloading the response body until it is accessed
+
+        Returns:
+            requests.Response: request's response
+
+        Raises:
+            ServiceError: If anything goes wrong
+            DeadlineExceededError: If the deadline passes before the request succeeds
+        """
+        if stream or self.response_cache is None or not self._is_cached_service(url):
+            return self._get_uncached(url, parameters, stream=stream)
+        return self._get_revalidated(url, parameters, ResponseCache.get_key(self.username, url, parameters))
+
+    def _get_uncached(self, url, parameters=None, stream=False, extra_headers=None):
+        """Sends a GET request to the given service url, bypassing the response cache."""
+        headers = {'Accept': 'application/json'}
+        if extra_headers:
+            headers.update(extra_headers)
+        response = self._get_with_retries(url, parameters, headers, stream)
+        if not response.ok:
+            raise ServiceError("ERROR: GET {url}: {r.status_code}:{r.text}".format(url=url, r=response))
+        return response
+
+    def _get_revalidated(self, url, parameters, cache_key, cached_response=None, immutable_without_validators=False):
+        """Sends a conditional GET request if a response is cached under the given key and returns the cached response
+        if the server confirms that it is still current. Otherwise, the new response is cached, as immutable if
+        `immutable_without_validators` is set and the server sent no validators. The cached response may be passed in
+        if the caller already looked it up."""
+        if cached_response is None:
+            cached_response = self.response_cache.lookup(cache_key)
+        if cached_response is not None and cached_response.immutable:
+            self.response_cache.record_hit()
+            return cached_response.to_response(url)
+
+        validators = cached_response.get_validators() if cached_response is not None else None
+        response = self._get_uncached(url, parameters, extra_headers=validators)
+        if cached_response is not None and response.status_code == 304:
+            self.response_cache.record_hit(revalidated=True)
+            return cached_response.to_response(url)
+        self.response_cache.record_miss()
+        self.response_cache.store(cache_key, response,
+                                  immutable=immutable_without_validators and not has_validators(response))
+        return response
+
+    def _is_cached_service(self, url):
+        """Returns whether the given url belongs to one of the cached services."""
+        return any(url.startswith(self.get_project_service_url(service))
+                   for service in PrecommitTeamscaleClient.CACHED_SERVICES)
+
+    def put(self, url, json=None, parameters=None, data=None):
+        """Sends a PUT request to the given service url with the json payload as content. PUT requests are not
+        retried, as they trigger server side processing.
+
+        Args:
+            url (str):  The URL for which to execute a PUT request
+            json: The Object to attach as content, will be serialized to json
+            parameters (dict): parameters to attach to the url
+            data: The data object to be attached to the request
+
+        Returns:
+            requests.Response: request's response
+
+        Raises:
+            ServiceError: If anything goes wrong
+            DeadlineExceededError: If the deadline passes before the request succeeds
+        """
+        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+        try:
+            response = self.session.put(url, params=parameters, json=json, data=data, headers=headers,
+                                        auth=self.auth_header, verify=self.sslverify,
+                                        timeout=self._get_request_timeout())
+        except requests.exceptions.Timeout:
+            self.get_remaining_time()
+            raise
+        if not response.ok:
+            raise ServiceError("ERROR: PUT {url}: {r.status_code}:{r.text}".format(url=url, r=response))
+        return response
+
+    def get_precommit_analysis_results(self, polling_interval=None):
+        """Gets precommit analysis results. Polls the server until the results are ready or the deadline passes.
+
+        Args:
+            polling_interval (float): Seconds between two polls. By default, `POLLING_INTERVAL_IN_SECONDS`.
+
+        Returns:
+            A tuple consisting of three lists: added findings, removed findings, and findings in changed code.
+        """
+        service_url = self.get_project_service_url("pre-commit")
+        if polling_interval is None:
+            polling_interval = PrecommitTeamscaleClient.POLLING_INTERVAL_IN_SECONDS
+
+        while True:
+            response = self.get(service_url)
+            # The service returns 204 while the pre-commit analysis is still in progress.
+            if response.status_code != 200:
+                self.wait(polling_interval)
+            else:
+                return self._parse_findings_response(service_url, response)
+
+    def get_commit_for_revision(self, revision_id):
+        """Retrieves the Teamscale commit corresponding to a revision, raising an error if the commit is not known
+        to Teamscale. The commit of a revision does not change once it is known, so it is only retrieved once.
+
+        Args:
+            revision_id (str) The revision ID (e.g., commit SHA)
+
+        Returns:
+            str: The teamscale commit
+        """
+        commit = self._commits_by_revision.get(revision_id)
+        if commit is None:
+            if self.response_cache is None:
+                commit = super(PrecommitTeamscaleClient, self).get_commit_for_revision(revision_id)
+            else:
+                commit = self._get_cached_commit_for_revision(revision_id)
+            self._commits_by_revision[revision_id] = commit
+        return commit
+
+    def _get_cached_commit_for_revision(self, revision_id):
+        """Retrieves the Teamscale commit of a revision like `get_commit_for_revision`, but through the response
+        cache. Once the server knows the revision, the response is cached as immutable, so that later runs resolve the
+        revision without any request."""
+        service_url = self.get_project_service_url("repository-timestamp-by-revision") + revision_id
+        cache_key = ResponseCache.get_key(self.username, service_url)
+        cached_response = self.response_cache.lookup(cache_key)
+        if cached_response is not None and cached_response.immutable:
+            self.response_cache.record_hit()
+            response_json = cached_response.to_response(service_url).json()
+        else:
+            response = self._get_uncached(service_url)
+            self.response_cache.record_miss()
+            response_json = response.json()
+            # The server does not know the revision yet if it has not analyzed it, which may still change
+            if response_json:
+                self.response_cache.store(cache_key, response, immutable=True)
+
+        if not response_json:
+            raise ServiceError("Could not find commit in Teamscale for given revision: {rev}".format(rev=revision_id))
+        return response_json[0]["branchName"] + ":" + str(response_json[0]["timestamp"])
+
+    def get_findings(self, uniform_path, timestamp, recursive=True, revision_id=None, assessments=None,
+                     categories=None):
+        """Retrieves the list of findings in the currently active project for the given uniform path
+        at the provided timestamp on the given branch.
+
+        Args:
+            uniform_path (str): The uniform path to get findings for.
+            timestamp (datetime.datetime): timestamp (unix format) for which to get the findings
+            recursive (bool): Whether to also get findings for files under the given path.
+            revision_id (str): If provided, the findings are retrieved for the Teamscale commit of this revision.
+            assessments (List[str]): If provided, only findings with one of these assessments are requested.
+            categories (List[str]): If provided, only findings in one of these categories are requested.
+
+        Returns:
+            FindingsStore: The findings.
+
+        Raises:
+            ServiceError: If anything goes wrong
+        """
+        service_url = self.get_project_service_url("findings") + uniform_path
+        if revision_id and self.response_cache is not None:
+            return self._findings_from_json(
+                self._get_findings_for_revision(service_url, recursive, revision_id, assessments, categories).json())
+        parameters = self._get_findings_parameters(timestamp, recursive, revision_id, assessments, categories)
+        response = self.get(service_url, parameters=parameters)
+        return self._findings_from_json(response.json())
+
+    def _get_findings_for_revision(self, service_url, recursive, revision_id, assessments, categories):
+        """Returns the findings response for the given revision. The revision itself identifies the response in the
+        cache. If the server sends validators, the response is revalidated, as the findings may still change while the
+        server analyzes the commit. Otherwise, the findings are considered final and reused without even resolving the
+        revision."""
+        cache_key = ResponseCache.get_key(self.username, service_url, revision_id, recursive, assessments, categories)
+        cached_response = self.response_cache.lookup(cache_key)
+        if cached_response is not None and cached_response.immutable:
+            self.response_cache.record_hit()
+            return cached_response.to_response(service_url)
+
+        parameters = self._get_findings_parameters(None, recursive, revision_id, assessments, categories)
+        return self._get_revalidated(service_url, parameters, cache_key, cached_response=cached_response,
+                                     immutable_without_validators=True)
+
+    def iter_findings(self, uniform_path, timestamp, recursive=True, revision_id=None, assessments=None,
+                      categories=None):
+        """Retrieves the findings for the given uniform path like `get_findings`, but streams the response and yields
+        the findings one by one while they are downloaded.
+
+        Returns:
+            Iterator[CompactFinding]: The findings.
+
+        Raises:
+            ServiceError: If anything goes wrong
+            DeadlineExceededError: If the deadline passes before all findings are retrieved
+        """
+        service_url = self.get_project_service_url("findings") + uniform_path
+        parameters = self._get_findings_parameters(timestamp, recursive, revision_id, assessments, categories)
+        response = self.get(service_url, parameters=parameters, stream=True)
+        try:
+            for finding_json in iter_json_array(self._iter_response_content(response)):
+                yield self._finding_from_json(finding_json)
+        finally:
+            response.close()
+
+    def _get_findings_parameters(self, timestamp, recursive, revision_id, assessments, categories):
+        """Returns the query parameters of a findings request. Filters are passed to the server so that it only sends
+        matching findings. Servers that do not support a filter ignore it, so callers must not rely on them."""
+        if revision_id:
+            timestamp = self.get_commit_for_revision(revision_id)
+        else:
+            timestamp = self._get_timestamp_parameter(timestamp=timestamp)
+
+        parameters = {
+            "t": timestamp,
+            "recursive": recursive,
+            "all": True
+        }
+        if assessments:
+            parameters["assessment-filters"] = assessments
+        if categories:
+            # The filter excludes the given categories unless it is inverted
+            parameters["filter"] = categories
+            parameters["invert"] = True
+        return parameters
+
+    def _findings_from_json(self, findings_json):
+        """Parses JSON encoded findings into a compact store.
+
+        Returns:
+            FindingsStore: The findings that were parsed from the JSON object
+        """
+        return FindingsStore(self._finding_from_json(finding) for finding in findings_json)
+
+    def _finding_from_json(self, finding_json):
+        """Parses a single JSON encoded finding, keeping its category (if the server sends it) for filtering.
+
+        Returns:
+            CompactFinding: The finding that was parsed from the JSON object
+        """
+        return CompactFinding(finding_type_id=finding_json['typeId'],
+                              message=finding_json['message'],
+                              assessment=finding_json['assessment'],
+                              start_offset=self._get_finding_location_entry(finding_json, 'rawStartOffset', 0),
+                              end_offset=self._get_finding_location_entry(finding_json, 'rawEndOffset', 0),
+                              start_line=self._get_finding_location_entry(finding_json, 'rawStartLine', 1),
+                              end_line=self._get_finding_location_entry(finding_json, 'rawEndLine', 1),
+                              uniform_path=finding_json['location']['uniformPath'],
+                              finding_id=finding_json['id'],
+                              category=finding_json.get('categoryName'))
+
+    def _iter_response_content(self, response):
+        """Yields the body of a streamed response in chunks, stopping once the deadline passes."""
+        try:
+            for chunk in response.iter_content(chunk_size=PrecommitTeamscaleClient.STREAMING_CHUNK_SIZE):
+                self.get_remaining_time()
+                yield chunk
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self.get_remaining_time()
+            raise
+
+    def _get_with_retries(self, url, parameters, headers, stream=False):
+        """Sends a GET request, retrying connection errors, timeouts and transient server errors. Streamed requests
+        are never hedged, as the losing response would keep its connection busy."""
+        attempt = 0
+        while True:
+            try:
+                if stream:
+                    response = self._timed_get(url, parameters, headers, stream=True)
+                else:
+                    response = self._hedged_get(url, parameters, headers)
+                if response.status_code not in PrecommitTeamscaleClient.RETRYABLE_STATUS_CODES \
+                        or attempt >= self.max_retries:
+                    return response
+                response.close()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                # Turns timeouts caused by the deadline into the corresponding error
+                self.get_remaining_time()
+                if attempt >= self.max_retries:
+                    raise
+            self.wait(self._get_backoff(attempt))
+            attempt += 1
+
+    @staticmethod
+    def _get_backoff(attempt):
+        """Returns a randomly jittered backoff for the given retry attempt ("full jitter")."""
+        backoff = min(PrecommitTeamscaleClient.RETRY_BACKOFF_CAP_IN_SECONDS,
+                      PrecommitTeamscaleClient.RETRY_BACKOFF_BASE_IN_SECONDS * 2 ** attempt)
+        return random.uniform(0, backoff)
+
+    def _hedged_get(self, url, parameters, headers):
+        """Sends a GET request and, if it is slower than the hedging threshold, a duplicate of it. Returns the first
+        successful response."""
+        threshold = self._get_hedging_threshold()
+        if threshold is None:
+            return self._timed_get(url, parameters, headers)
+
+        results = queue.Queue()
+        self._start_hedged_request(results, url, parameters, headers)
+        pending_requests = 1
+        try:
+            result = results.get(timeout=threshold)
+        except queue.Empty:
+            self._start_hedged_request(results, url, parameters, headers)
+            pending_requests += 1
+            result = results.get()
+
+        while True:
+            pending_requests -= 1
+            response, error = result
+            if error is None:
+                return response
+            if pending_requests == 0:
+                raise error
+            result = results.get()
+
+    def _start_hedged_request(self, results, url, parameters, headers):
+        """Sends a GET request on a new thread and puts its response or error into the given queue. The thread is a
+        daemon, so that a request that lost against its duplicate neither delays the exit of the process nor queues
+        behind the requests of other callers."""
+        def send():
+            try:
+                results.put((self._timed_get(url, parameters, headers), None))
+            except Exception as error:
+                results.put((None, error))
+
+        thread = threading.Thread(target=send)
+        thread.daemon = True
+        thread.start()
+
+    def _get_hedging_threshold(self):
+        """Returns the latency after which a GET request is hedged or `None` if requests should not be hedged."""
+        if self.hedging_percentile is None or len(self.latencies) < PrecommitTeamscaleClient.HEDGING_MIN_SAMPLES:
+            return None
+        sorted_latencies = sorted(self.latencies)
+        index = int(math.ceil(self.hedging_percentile / 100.0 * len(sorted_latencies))) - 1
+        return sorted_latencies[max(0, min(index, len(sorted_latencies) - 1))]
+
+    def _timed_get(self, url, parameters, headers, stream=False):
+        """Sends a single GET request and records its latency (until the response headers arrive for streamed
+        requests)."""
+        start = time.time()
+        response = self.session.get(url, params=parameters, auth=self.auth_header, verify=self.sslverify,
+                                    headers=headers, timeout=self._get_request_timeout(), stream=stream)
+        self._record_latency(time.time() - start)
+        return response
+
+    def _record_latency(self, latency):
+        """Adds the latency of a GET request to the hedging samples and the request statistics."""
+        self.latencies.append(latency)
+        with self._request_statistics_lock:
+            self.request_count += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def _get_request_timeout(self):
+        """Returns the (connect, read) timeout tuple for the next request, bounded by the deadline. As it is called
+        right before every request, it also checks for cancellation."""
+        self._check_cancellation()
+        remaining = self.get_remaining_time()
+        if remaining is None:
+            return self.connect_timeout, self.read_timeout
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
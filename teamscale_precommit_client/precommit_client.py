@@ -3,47 +3,122 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
-import copy
+import collections
+import contextlib
 import datetime
+import itertools
+import json
 import os
+import posixpath
+import re
+import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-from teamscale_client import TeamscaleClient
+from teamscale_client.data import ServiceError
 
 from teamscale_precommit_client.client_configuration_utils import get_teamscale_client_configuration
-from teamscale_precommit_client.data import PreCommitUploadData
-from teamscale_precommit_client.git_utils import get_changed_files_and_content, get_deleted_files
+from teamscale_precommit_client.data import PreCommitUploadData, PrecommitResult
+from teamscale_precommit_client.file_patterns import FilePatterns
+from teamscale_precommit_client.findings_history import FindingsHistory
+from teamscale_precommit_client.findings_mirror import FindingsMirror
+from teamscale_precommit_client.findings_store import FindingsStore
+from teamscale_precommit_client.findings_stream import sort_externally
+from teamscale_precommit_client.git_utils import get_changed_files_and_content, get_deleted_files, get_staged_changes
+from teamscale_precommit_client.git_utils import get_changes_in_subrepositories
 from teamscale_precommit_client.git_utils import get_current_branch, get_current_timestamp, get_current_commit_sha
-from teamscale_precommit_client.git_utils import get_repo_root_from_file_in_repo
+from teamscale_precommit_client.git_utils import get_repo_root_from_file_in_repo, get_client_state_dir
+from teamscale_precommit_client.http_client import PrecommitTeamscaleClient, DeadlineExceededError
+from teamscale_precommit_client.http_client import DEFAULT_CONNECT_TIMEOUT_IN_SECONDS, DEFAULT_READ_TIMEOUT_IN_SECONDS
+from teamscale_precommit_client.http_client import DEFAULT_MAX_RETRIES
+from teamscale_precommit_client.recording import Recording, RecordingAdapter, ReplayAdapter
+from teamscale_precommit_client.response_cache import ResponseCache
+from teamscale_precommit_client.run_coordination import RunCoordinator, RunSupersededError
 
 # Filename of the precommit configuration. The client expects this config file at the root of the repository.
 PRECOMMIT_CONFIG_FILENAME = '.teamscale-precommit.config'
 DEFAULT_PROJECT_SUBPATH = ''
 DEFAULT_PATH_PREFIX = ''
 DEFAULT_FILE_ENCODING = None  # Use system encoding
+# Exit status if the overall deadline passed before all results could be retrieved.
+EXIT_CODE_DEADLINE_EXCEEDED = 3
+# Deadline in seconds used in hook mode unless another one is given. Keeps commits from hanging on a slow server. The
+# local work of a hook run takes well under a second, but the server needs a few seconds to analyze the changes.
+DEFAULT_HOOK_DEADLINE_IN_SECONDS = 5
+DEFAULT_SUBREPOSITORY_WORKERS = 8
+DEFAULT_FINDINGS_MIRROR_MAX_AGE_IN_SECONDS = 60 * 60
+# Number of seconds after which a sync of the findings mirror that did not finish is considered failed and started again.
+FINDINGS_MIRROR_SYNC_TIMEOUT_IN_SECONDS = 10 * 60
+# Only command-line argument of the detached process of the client that syncs the findings mirror.
+FINDINGS_MIRROR_SYNC_ARGUMENT = '--sync-findings-mirror'
+DEFAULT_RESPONSE_CACHE_SIZE_IN_MEGABYTES = 64
+# Output formats: human-readable lines most editors understand, or one JSON object per finding (JSON Lines).
+OUTPUT_FORMAT_TEXT = 'text'
+OUTPUT_FORMAT_JSONL = 'jsonl'
+# Name of the file in the client state directory caching the file patterns of the Teamscale project.
+FILE_PATTERNS_CACHE_FILENAME = 'file-patterns.json'
+# Number of seconds after which the file patterns of the Teamscale project are retrieved again.
+FILE_PATTERNS_MAX_AGE_IN_SECONDS = 24 * 60 * 60
 
 
 class PrecommitClient:
     """Client for precommit analysis"""
     # Number of seconds the client waits until fetching precommit results from the server.
     PRECOMMIT_WAITING_TIME_IN_SECONDS = 2
+    # Number of seconds the client waits until fetching precommit results, and between two polls for them, in hook
+    # mode. Results are polled more often, so that a commit is not delayed longer than needed.
+    HOOK_PRECOMMIT_WAITING_TIME_IN_SECONDS = 0.25
+    # Maximum number of concurrent requests for the existing findings in several analyzed files.
+    EXISTING_FINDINGS_WORKERS = 8
 
     def __init__(self, teamscale_config, repository_path, path_prefix=DEFAULT_PATH_PREFIX, project_subpath='',
                  analyzed_file=None, verify=True, omit_links_to_findings=False, exclude_findings_in_changed_code=False,
                  fetch_existing_findings=False, fetch_all_findings=False, fetch_existing_findings_in_changes=False,
                  fail_on_red_findings=False, log_to_stderr=False, file_encoding=DEFAULT_FILE_ENCODING,
-                 ignore_subrepositories=False):
-        """Constructor"""
-        self.teamscale_client = TeamscaleClient(teamscale_config.url, teamscale_config.username,
-                                                teamscale_config.access_token, teamscale_config.project_id, verify)
+                 ignore_subrepositories=False, connect_timeout=DEFAULT_CONNECT_TIMEOUT_IN_SECONDS,
+                 read_timeout=DEFAULT_READ_TIMEOUT_IN_SECONDS, max_retries=DEFAULT_MAX_RETRIES,
+                 hedging_percentile=None, deadline=None, only_changed_findings=False, sort_findings=True,
+                 assessment_filter=None, category_filter=None, hook_mode=False, include_subrepositories=False,
+                 subrepository_workers=DEFAULT_SUBREPOSITORY_WORKERS, supersede_previous_runs=False,
+                 use_findings_mirror=False, findings_mirror_max_age=DEFAULT_FINDINGS_MIRROR_MAX_AGE_IN_SECONDS,
+                 use_response_cache=False, response_cache_size=DEFAULT_RESPONSE_CACHE_SIZE_IN_MEGABYTES,
+                 profile=False, skip_unanalyzed_files=False, output_format=OUTPUT_FORMAT_TEXT,
+                 analyzed_files=None, record_file=None, replay_file=None, replay_latency_scale=1.0):
+        """Constructor. Existing findings are fetched for the `analyzed_files` or, if there are none, for the
+        `analyzed_file`.
+
+        If a `record_file` is given, all HTTP exchanges and a manifest of the analyzed git snapshot are saved to it
+        after each run. If a `replay_file` is given, the recorded exchanges and git snapshot are replayed instead of
+        contacting the server and examining the repository, with latencies scaled by `replay_latency_scale`."""
+        self.record_file = record_file
+        self.recording = None
+        self.replayed_recording = None
+        transport_adapter = None
+        if replay_file:
+            self.replayed_recording = Recording.load(replay_file)
+            transport_adapter = ReplayAdapter(self.replayed_recording, replay_latency_scale)
+        elif record_file:
+            self.recording = Recording()
+            transport_adapter = RecordingAdapter(self.recording, PrecommitTeamscaleClient.get_connection_pool_size(
+                PrecommitClient.EXISTING_FINDINGS_WORKERS))
+        self.teamscale_client = PrecommitTeamscaleClient(teamscale_config.url, teamscale_config.username,
+                                                         teamscale_config.access_token, teamscale_config.project_id,
+                                                         verify, connect_timeout=connect_timeout,
+                                                         read_timeout=read_timeout, max_retries=max_retries,
+                                                         hedging_percentile=hedging_percentile,
+                                                         transport_adapter=transport_adapter,
+                                                         max_concurrent_requests=self.EXISTING_FINDINGS_WORKERS)
         self.repository_path = repository_path
+        self.teamscale_config = teamscale_config
+        self.config_file = teamscale_config.config_file
 
         # calling os.path.join ensures a tailing '/'
         self.path_prefix = os.path.join(path_prefix, '')
         self.project_subpath = os.path.join(project_subpath, '')
 
-        self.analyzed_file = analyzed_file
+        self.analyzed_files = analyzed_files or ([analyzed_file] if analyzed_file else [])
+        self.analyzed_file = self.analyzed_files[0] if self.analyzed_files else None
         self.omit_links_to_findings = omit_links_to_findings
         self.exclude_findings_in_changed_code = exclude_findings_in_changed_code
         self.fetch_existing_findings = fetch_existing_findings
@@ -53,47 +128,232 @@ class PrecommitClient:
         self.log_to_stderr = log_to_stderr
         self.changed_files = {}
         self.deleted_files = []
-        self.added_findings = []
-        self.removed_findings = []
-        self.existing_findings = []
-        self.findings_in_changed_code = []
         self.current_branch = ''
         self.parent_commit_timestamp = 0
         self.file_encoding = file_encoding
         self.ignore_subrepositories = ignore_subrepositories
+        self.deadline = deadline
+        self.only_changed_findings = only_changed_findings
+        self.sort_findings = sort_findings
+        self.assessment_filter = assessment_filter
+        self.category_filter = category_filter
+        self.hook_mode = hook_mode
+        self.include_subrepositories = include_subrepositories
+        self.subrepository_workers = subrepository_workers
+        self.supersede_previous_runs = supersede_previous_runs
+        self.use_findings_mirror = use_findings_mirror
+        self.findings_mirror_max_age = findings_mirror_max_age
+        self.use_response_cache = use_response_cache
+        self.response_cache_size = response_cache_size
+        self.profile = profile
+        self.skip_unanalyzed_files = skip_unanalyzed_files
+        self.output_format = output_format
+        self.print_results = True
+        self._reset_run_state()
+
+    def _reset_run_state(self):
+        """Resets the state of a single run, so that the client can be used for several runs."""
+        self.added_findings = FindingsStore()
+        self.removed_findings = FindingsStore()
+        self.existing_findings = FindingsStore()
+        self.existing_findings_by_file = collections.OrderedDict()
+        self.findings_in_changed_code = FindingsStore()
+        self.existing_findings_printed = False
+        self.findings_history = None
+        self.run_coordinator = None
+        self.findings_mirror = None
+        self.findings_mirror_is_fresh = False
+        self.result = PrecommitResult()
+
+    def analyze(self):
+        """Performs the precommit analysis like `run`, but returns the results instead of printing them and never
+        exits. Meant for tools embedding the client, which may call it repeatedly: the HTTP session and the repository
+        handles are reused across calls. Only findings changed since the last run (`only_changed_findings`) are not
+        supported, as they only affect the printed output.
+
+        Returns:
+            PrecommitResult: The findings, timings and upload statistics of the analysis.
+        """
+        return self._analyze(print_results=False)
 
     def run(self):
         """Performs the precommit analysis. Depending on the modifications made and the flags provided to the client,
-        this triggers precommit analysis or just queries existing findings."""
-        self._calculate_modifications()
-        self._retrieve_current_branch()
-        self._retrieve_parent_commit_timestamp()
+        this triggers precommit analysis or just queries existing findings.
+
+        If the deadline passes before all results are retrieved, the results obtained so far are printed and the
+        client exits with `EXIT_CODE_DEADLINE_EXCEEDED`. In hook mode, the client exits successfully instead, so that
+        an unresponsive server does not block commits.
+
+        If previous runs are superseded and a newer run starts in the same repository, this run stops without printing
+        further findings."""
+        result = self._analyze(print_results=True)
+        if result.status != PrecommitResult.STATUS_COMPLETED or result.exit_code != 0:
+            exit(result.exit_code)
+
+    def _analyze(self, print_results):
+        """Performs the precommit analysis, printing the results if requested, and returns the results."""
+        self.print_results = print_results
+        self._reset_run_state()
+        start = time.time()
+        self.teamscale_client.reset_request_statistics()
+        self.teamscale_client.set_deadline(self.deadline)
+        if self.use_response_cache and self.teamscale_client.response_cache is None:
+            self.teamscale_client.response_cache = ResponseCache.for_repository(
+                self._get_client_state_dir(), self.response_cache_size * 1024 * 1024)
+        if self.supersede_previous_runs:
+            self._register_run()
+        try:
+            self._run_analysis()
+        except DeadlineExceededError:
+            self._print_partial_results()
+            self.result.status = PrecommitResult.STATUS_DEADLINE_EXCEEDED
+            self.result.exit_code = 0 if self.hook_mode else EXIT_CODE_DEADLINE_EXCEEDED
+        except RunSupersededError:
+            self._print('> Cancelled, as a newer analysis was started in this repository.')
+            self.result.status = PrecommitResult.STATUS_SUPERSEDED
+        finally:
+            self.result.timings['total'] = time.time() - start
+            if self.profile and self.print_results:
+                self._print_profile()
+        if self.recording is not None:
+            self.recording.manifest = self._get_snapshot_manifest()
+            self.recording.save(self.record_file)
+        return self.result
+
+    def _register_run(self):
+        """Registers this run as the newest one in the repository, so that earlier runs stop."""
+        self.run_coordinator = RunCoordinator.for_repository(self._get_client_state_dir())
+        self.run_coordinator.register()
+        self.teamscale_client.cancellation_check = self.run_coordinator.check
+
+    def _run_analysis(self):
+        """Calculates the modifications, triggers precommit analysis and prints the requested findings."""
+        with self._timed('changes'):
+            if self.replayed_recording is not None:
+                self._restore_snapshot(self.replayed_recording.manifest)
+            else:
+                self._calculate_modifications()
+                self._retrieve_current_branch()
+                self._retrieve_parent_commit_timestamp()
+        if self.only_changed_findings and self.print_results and self.output_format == OUTPUT_FORMAT_TEXT:
+            self.findings_history = FindingsHistory.load(self._get_client_state_dir(), self.current_branch)
+        if self.use_findings_mirror and self.fetch_existing_findings and not self.fetch_existing_findings_in_changes \
+                and not self.fetch_all_findings and self.replayed_recording is None:
+            self._start_findings_mirror_sync()
 
         if self.changed_files or self.deleted_files:
             self._do_precommit_analysis()
             self._print_precommit_results_as_error_string()  # Always uses precommit branch
         elif not self.fetch_all_findings and not self.fetch_existing_findings:
-            print("No changed files found. Did you forget to `git add` new files?")
-            exit(0)
-
-        if self.fetch_existing_findings_in_changes:
-            self._get_existing_findings_in_changes()
-            self._print_findings('Existing findings:', self.existing_findings, self._get_precommit_branch())
-        elif self.fetch_existing_findings or self.fetch_all_findings:
-            self._get_existing_findings()
-            self._print_findings('Existing findings:', self.existing_findings, self.current_branch)
+            self._print("No changed files found. Did you forget to `git add` new files?")
+            self.result.status = PrecommitResult.STATUS_NO_CHANGES
+            return
+
+        with self._timed('existing findings'):
+            if self.fetch_existing_findings_in_changes:
+                self._get_existing_findings_in_changes()
+                self._print_findings('Existing findings:', self.existing_findings, self._get_precommit_branch())
+                self.existing_findings_printed = True
+            elif self.fetch_all_findings:
+                self._print_findings('Existing findings:', self._iter_all_existing_findings(), self.current_branch)
+                self.existing_findings_printed = True
+            elif self.fetch_existing_findings:
+                self._get_existing_findings()
+                self._print_existing_findings_by_file()
+                self.existing_findings_printed = True
+
+        if self.findings_history:
+            self.findings_history.save()
 
         if self.fail_on_red_findings and self._did_precommit_analysis_yield_red_findings():
-            exit(1)
+            self.result.exit_code = 1
+
+    def _get_snapshot_manifest(self):
+        """Returns the manifest of the analyzed git snapshot stored with recordings. The content of changed files is
+        not stored, only its length."""
+        return {
+            'branch': self.current_branch,
+            'commit': self._get_commit_hash(),
+            'parent_commit_timestamp': self.parent_commit_timestamp,
+            'changed_files': dict((path, len(content)) for path, content in self.changed_files.items()),
+            'deleted_files': list(self.deleted_files)
+        }
+
+    def _restore_snapshot(self, manifest):
+        """Restores the git snapshot described by the given manifest instead of examining the repository. Changed
+        files get placeholder content of their original length."""
+        self.current_branch = manifest['branch']
+        self.parent_commit_timestamp = manifest['parent_commit_timestamp']
+        self.changed_files = dict((path, 'x' * length) for path, length in manifest['changed_files'].items())
+        self.deleted_files = list(manifest['deleted_files'])
+
+    @contextlib.contextmanager
+    def _timed(self, phase):
+        """Records the time spent in the enclosed block as timing of the given phase."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.result.timings[phase] = time.time() - start
 
     def _calculate_modifications(self):
-        """Calculates the changed and deleted files in the repository."""
+        """Calculates the changed and deleted files in the repository. In hook mode, only staged changes are
+        considered. If subrepositories are included, the changes in all submodules are added. If unanalyzed files are
+        skipped, changed files not analyzed by the Teamscale project are left out without reading them."""
         if not self.repository_path or not os.path.exists(self.repository_path) or not os.path.isdir(
                 self.repository_path):
             raise RuntimeError('Invalid path to file in repository: %s' % self.repository_path)
-        self.changed_files = get_changed_files_and_content(self.repository_path, self.file_encoding,
-                                                           self.ignore_subrepositories)
-        self.deleted_files = get_deleted_files(self.repository_path, self.ignore_subrepositories)
+        path_filter = None
+        if self.skip_unanalyzed_files:
+            path_filter = self._get_file_patterns().matches
+        # Submodules are examined separately if they are included
+        ignore_subrepositories = self.ignore_subrepositories or self.include_subrepositories
+        if self.hook_mode:
+            self.changed_files, self.deleted_files = get_staged_changes(self.repository_path, self.file_encoding,
+                                                                        ignore_subrepositories, path_filter,
+                                                                        self._on_skipped_file)
+        else:
+            self.changed_files = get_changed_files_and_content(self.repository_path, self.file_encoding,
+                                                               ignore_subrepositories, path_filter,
+                                                               self._on_skipped_file)
+            self.deleted_files = get_deleted_files(self.repository_path, ignore_subrepositories)
+
+        if self.include_subrepositories:
+            changed_files, deleted_files = get_changes_in_subrepositories(self.repository_path, self.file_encoding,
+                                                                          self.subrepository_workers,
+                                                                          staged_only=self.hook_mode,
+                                                                          path_filter=path_filter,
+                                                                          on_skipped_file=self._on_skipped_file)
+            self.changed_files.update(changed_files)
+            self.deleted_files.extend(deleted_files)
+
+    def _on_skipped_file(self, path, reason):
+        """Adds the changed file at the given path that is not analyzed to the result and prints the reason. Like all
+        messages, it is printed to stderr in JSON Lines format."""
+        self.result.skipped_files[path] = reason
+        self._print(reason)
+
+    def _get_file_patterns(self):
+        """Returns the patterns of the files analyzed by the Teamscale project. They are taken from the local
+        configuration file if it defines any. Otherwise, they are retrieved from the project configuration on the server
+        and cached for a day. If the project configuration cannot be retrieved, all files are considered analyzed."""
+        if self.config_file:
+            file_patterns = FilePatterns.from_config_file(self.config_file)
+            if file_patterns is not None:
+                return file_patterns
+
+        cache_file = os.path.join(self._get_client_state_dir(), FILE_PATTERNS_CACHE_FILENAME)
+        project_key = '%s/p/%s' % (self.teamscale_client.url, self.teamscale_client.project)
+        file_patterns = FilePatterns.load(cache_file, project_key, FILE_PATTERNS_MAX_AGE_IN_SECONDS)
+        if file_patterns is None:
+            try:
+                project_configuration = self.teamscale_client.get_project_configuration(self.teamscale_client.project)
+                file_patterns = FilePatterns.from_project_configuration(project_configuration)
+            except ServiceError:
+                # Reading the project configuration requires permissions not every user has
+                file_patterns = FilePatterns([])
+            file_patterns.save(cache_file, project_key)
+        return file_patterns
 
     def _retrieve_current_branch(self):
         """Retrieves the current branch from the repository."""
@@ -105,19 +365,26 @@ class PrecommitClient:
 
     def _do_precommit_analysis(self):
         """Uploads changed and deleted files to Teamscale, waits for the results, and interprets them."""
-        self._upload_precommit_data()
-        # We need to wait for the analysis to pick up the new code otherwise we get old findings.
-        # This might not be needed in future releases of Teamscale.
-        time.sleep(PrecommitClient.PRECOMMIT_WAITING_TIME_IN_SECONDS)
-        print('Waiting for precommit analysis results...')
-        print('')
-        self._wait_and_get_precommit_result()
+        with self._timed('upload'):
+            self._upload_precommit_data()
+        with self._timed('precommit analysis'):
+            # We need to wait for the analysis to pick up the new code otherwise we get old findings.
+            # This might not be needed in future releases of Teamscale.
+            if self.hook_mode:
+                self.teamscale_client.wait(PrecommitClient.HOOK_PRECOMMIT_WAITING_TIME_IN_SECONDS)
+            else:
+                self.teamscale_client.wait(PrecommitClient.PRECOMMIT_WAITING_TIME_IN_SECONDS)
+            self._print('Waiting for precommit analysis results...')
+            self._print('')
+            self._wait_and_get_precommit_result()
 
     def _upload_precommit_data(self):
         """Uploads the currently changed files for precommit analysis."""
+        if self.run_coordinator:
+            self.run_coordinator.check()
         self.teamscale_client.branch = self.current_branch
 
-        print("Uploading changes on branch '%s' in '%s'..." % (self.current_branch, self.repository_path))
+        self._print("Uploading changes on branch '%s' in '%s'..." % (self.current_branch, self.repository_path))
 
         changed_files_in_project = self._filter_changed_files_in_project_subpath(self.changed_files)
         deleted_files_in_project = self._filter_deleted_files_in_project_subpath(self.deleted_files)
@@ -125,6 +392,11 @@ class PrecommitClient:
         changed_files_with_path_prefix = self._apply_path_prefix_to_changed_files(changed_files_in_project)
         deleted_files_with_path_prefix = self._apply_path_prefix_to_deleted_files(deleted_files_in_project)
 
+        self.result.uploaded_files = len(changed_files_with_path_prefix)
+        self.result.uploaded_bytes = sum(len(content.encode('utf-8'))
+                                         for content in changed_files_with_path_prefix.values())
+        self.result.deleted_files = len(deleted_files_with_path_prefix)
+
         precommit_data = PreCommitUploadData(uniformPathToContentMap=changed_files_with_path_prefix,
                                              deletedUniformPaths=deleted_files_with_path_prefix)
         self.teamscale_client.upload_files_for_precommit_analysis(
@@ -151,36 +423,96 @@ class PrecommitClient:
 
     def _wait_and_get_precommit_result(self):
         """Gets the current precommit results. Waits synchronously until server is ready. """
+        polling_interval = PrecommitClient.HOOK_PRECOMMIT_WAITING_TIME_IN_SECONDS if self.hook_mode else None
         self.added_findings, self.removed_findings, self.findings_in_changed_code = \
-            self.teamscale_client.get_precommit_analysis_results()
+            self.teamscale_client.get_precommit_analysis_results(polling_interval)
 
     def _get_precommit_branch(self):
         """Returns the precommit branch of the current user."""
         return '__precommit__%s' % self.teamscale_client.username
 
-    def _print_findings(self, message, findings, branch):
-        """Print the specified list of findings for the specified branch, in a way most text editors understand. """
+    def _print_findings(self, message, findings, branch, history_section=None):
+        """Print the specified list of findings for the specified branch, in a way most text editors understand.
+        If only changed findings are requested, only the findings that changed since the previous run of the given
+        history section (by default the message) are printed. If results are not printed, the findings are added to
+        the result instead, using the message as section."""
+        if self.run_coordinator:
+            self.run_coordinator.check()
+        findings_without_path_prefix = (self._copy_finding_without_path_prefix(finding) for finding in findings)
+        findings_in_project = self._remove_findings_outside_project_subpath(findings_without_path_prefix)
+        findings_in_project = self._remove_findings_not_matching_filters(findings_in_project)
+
+        if not self.print_results:
+            if self.sort_findings:
+                findings_in_project = sorted(findings_in_project, key=self._get_finding_sort_key)
+            self.result.findings[message] = list(findings_in_project)
+            return
+        if self.output_format == OUTPUT_FORMAT_JSONL:
+            self._print_findings_as_json_lines(message.rstrip(':'), findings_in_project, branch)
+            return
+
         # Only log to stderr if there are findings
         # Otherwise it looks weird if "no findings" is marked as red (in QTCreator for example)
-        log_to_stderr = self.log_to_stderr and len(findings) > 0
+        first_finding = next(findings_in_project, None)
+        log_to_stderr = self.log_to_stderr and first_finding is not None
+        if first_finding is not None:
+            findings_in_project = itertools.chain([first_finding], findings_in_project)
 
         self._print('', log_to_stderr)
         self._print(message, log_to_stderr)
 
-        findings_without_path_prefix = list(
-            map(lambda finding: self._copy_finding_without_path_prefix(finding), findings))
-
-        findings_in_project = self._remove_findings_outside_project_subpath(findings_without_path_prefix)
-
-        for formatted_finding in self._format_findings(findings_in_project, branch):
+        if self.findings_history:
+            formatted_findings = self._format_changes_since_last_run(history_section or message, findings_in_project,
+                                                                     branch)
+        else:
+            formatted_findings = self._format_findings(findings_in_project, branch)
+        for formatted_finding in formatted_findings:
             self._print(formatted_finding, log_to_stderr)
 
     def _remove_findings_outside_project_subpath(self, findings):
-        return list(filter(lambda finding: finding.uniformPath.startswith(self.project_subpath), findings))
-
-    @staticmethod
-    def _print(message, print_to_err=False):
-        if print_to_err:
+        return (finding for finding in findings if finding.uniformPath.startswith(self.project_subpath))
+
+    def _remove_findings_not_matching_filters(self, findings):
+        """Removes findings not matching the assessment and category filters. The server already applies the filters
+        to existing findings if it supports them, but not to precommit findings."""
+        if self.assessment_filter:
+            findings = (finding for finding in findings if finding.assessment in self.assessment_filter)
+        if self.category_filter:
+            # Findings without category information cannot be filtered and are kept
+            findings = (finding for finding in findings if finding.category is None
+                        or finding.category in self.category_filter)
+        return findings
+
+    def _print_findings_as_json_lines(self, section, findings, branch):
+        """Prints each of the given findings as a compact JSON object on a line of its own. The output is flushed after
+        every finding, so that integrations can process findings while the remaining ones are retrieved."""
+        self.teamscale_client.branch = branch
+        if self.sort_findings:
+            findings = sort_externally(findings, key=self._get_finding_sort_key)
+
+        output = sys.stderr if self.log_to_stderr else sys.stdout
+        for finding in findings:
+            print(json.dumps(self._get_finding_as_json_object(finding, section), separators=(',', ':')), file=output)
+            output.flush()
+
+    def _get_finding_as_json_object(self, finding, section):
+        """Returns the JSON Lines representation of the given finding in the given output section."""
+        return {
+            'path': os.path.join(self.repository_path, finding.uniformPath),
+            'line': finding.startLine,
+            'assessment': finding.assessment,
+            'message': finding.message,
+            'findingId': finding.finding_id,
+            'section': section,
+            'link': None if self.omit_links_to_findings else self._get_finding_link(finding)
+        }
+
+    def _print(self, message, print_to_err=False):
+        """Prints the given message, unless results are not printed. In JSON Lines format, messages are printed to
+        stderr, so that stdout only contains findings."""
+        if not self.print_results:
+            return
+        if print_to_err or self.output_format == OUTPUT_FORMAT_JSONL:
             print(message, file=sys.stderr)
         else:
             print(message)
@@ -194,54 +526,195 @@ class PrecommitClient:
 
     def _did_precommit_analysis_yield_red_findings(self):
         """Returns whether the analysis resulted in any RED findings."""
-        added_red_findings = list(filter(lambda finding: finding.assessment == "RED", self.added_findings))
-        return len(added_red_findings) > 0
+        return self.added_findings.has_assessment("RED")
+
+    def _print_partial_results(self):
+        """Prints the existing findings retrieved before the deadline passed. Precommit findings are printed as soon as
+        they are available, so they need not be considered here."""
+        self._print('Teamscale did not respond within the deadline of %s seconds. Results are incomplete.'
+                    % self.deadline, print_to_err=True)
+        if self.existing_findings and not self.existing_findings_printed:
+            self._print_findings('Existing findings (incomplete):', self.existing_findings,
+                                 self.teamscale_client.branch)
+
+    def _print_profile(self):
+        """Prints statistics about the requests sent to Teamscale to stderr."""
+        client = self.teamscale_client
+        if client.request_count:
+            print('> Profile: %i GET requests, %.2fs total, %.2fs mean, %.2fs max latency.'
+                  % (client.request_count, client.total_latency, client.total_latency / client.request_count,
+                     client.max_latency), file=sys.stderr)
+        else:
+            print('> Profile: No GET requests.', file=sys.stderr)
+
+        response_cache = self.teamscale_client.response_cache
+        if response_cache is not None and response_cache.get_hit_rate() is not None:
+            print('> Response cache: %i hits (%i revalidated), %i misses, %.0f%% hit rate.'
+                  % (response_cache.hits, response_cache.revalidated_hits, response_cache.misses,
+                     response_cache.get_hit_rate() * 100), file=sys.stderr)
+
+    def _get_existing_findings_section(self, analyzed_file):
+        """Returns the output section for the existing findings in the given analyzed file."""
+        return 'Existing findings in %s:' % os.path.relpath(analyzed_file, self.repository_path)
+
+    def _print_existing_findings_by_file(self):
+        """Prints the existing findings in the analyzed files, grouped by file if there are several of them."""
+        if len(self.existing_findings_by_file) == 1:
+            analyzed_file = next(iter(self.existing_findings_by_file))
+            self._print_findings('Existing findings:', self.existing_findings, self.current_branch,
+                                 history_section=self._get_existing_findings_section(analyzed_file))
+            return
+        for analyzed_file, findings in self.existing_findings_by_file.items():
+            self._print_findings(self._get_existing_findings_section(analyzed_file), findings, self.current_branch)
 
     def _get_existing_findings(self):
-        """Gets the existing findings. This either fetches the findings in the path specified by the call to the script
-        or all findings if `fetch_all_findings` is `True`."""
+        """Gets the existing findings in the paths specified by the call to the script. The findings in several paths
+        are requested concurrently. If the findings mirror is up to date, the findings are taken from the mirror
+        instead of the server."""
         if self.changed_files or self.deleted_files:
             self.teamscale_client.branch = self._get_precommit_branch()
         else:
             self.teamscale_client.branch = self.current_branch
-        uniform_path = os.path.relpath(self.analyzed_file, self.repository_path)
-        uniform_path = os.path.join(self.path_prefix, uniform_path)
-        if self.fetch_all_findings:
-            uniform_path = ''
-        self.existing_findings = self.teamscale_client.get_findings(uniform_path=uniform_path, timestamp=None,
-                                                                    revision_id=self._get_commit_hash())
-        self._remove_precommit_findings_from_existing_findings()
+        uniform_paths = [os.path.join(self.path_prefix, os.path.relpath(analyzed_file, self.repository_path))
+                         for analyzed_file in self.analyzed_files]
+        if self.findings_mirror_is_fresh:
+            findings_by_path = [self._get_mirrored_findings(uniform_path) for uniform_path in uniform_paths]
+        else:
+            revision_id = self._get_commit_hash()
+            # Resolves the revision once instead of in every concurrent request. With a response cache, this is
+            # answered from the cache once the revision is known.
+            self.teamscale_client.get_commit_for_revision(revision_id)
+
+            def get_findings(uniform_path):
+                return self.teamscale_client.get_findings(uniform_path=uniform_path, timestamp=None,
+                                                          revision_id=revision_id,
+                                                          assessments=self.assessment_filter,
+                                                          categories=self.category_filter)
+
+            if len(uniform_paths) == 1:
+                findings_by_path = [get_findings(uniform_paths[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=PrecommitClient.EXISTING_FINDINGS_WORKERS) as executor:
+                    findings_by_path = list(executor.map(get_findings, uniform_paths))
+
+        self.existing_findings_by_file = collections.OrderedDict(
+            (analyzed_file, FindingsStore(finding for finding in findings if not self._is_precommit_finding(finding)))
+            for analyzed_file, findings in zip(self.analyzed_files, findings_by_path))
+        self.existing_findings = FindingsStore(itertools.chain.from_iterable(self.existing_findings_by_file.values()))
+
+    def _get_mirrored_findings(self, uniform_path):
+        """Returns the findings at the given uniform path from the findings mirror. The path may contain the separators
+        of the operating system, but the mirror stores paths separated by '/' like the server."""
+        mirrored_path = posixpath.normpath(uniform_path.replace(os.sep, '/'))
+        if mirrored_path == posixpath.curdir:
+            mirrored_path = ''
+        return self.findings_mirror.get_findings(self.current_branch, mirrored_path)
+
+    def _start_findings_mirror_sync(self):
+        """Starts filling the findings mirror in a detached process unless it is up to date for the current commit or
+        another run already started filling it. The process keeps running after this run, so that the client never
+        waits for all findings of the project; later runs use the mirror once it is complete."""
+        self.findings_mirror = FindingsMirror.for_repository(self._get_client_state_dir())
+        commit_sha = self._get_commit_hash()
+        if self.findings_mirror.is_fresh(self.current_branch, commit_sha, self.findings_mirror_max_age):
+            self.findings_mirror_is_fresh = True
+            return
+        if self.findings_mirror.claim_sync(self.current_branch, commit_sha, FINDINGS_MIRROR_SYNC_TIMEOUT_IN_SECONDS):
+            _spawn_findings_mirror_sync(self._get_findings_mirror_sync_job(commit_sha))
+
+    def _get_findings_mirror_sync_job(self, commit_sha):
+        """Returns the description of the findings mirror sync at the given commit, as passed to the process that
+        performs it."""
+        return {
+            'url': self.teamscale_config.url,
+            'username': self.teamscale_config.username,
+            'access_token': self.teamscale_config.access_token,
+            'project': self.teamscale_config.project_id,
+            'verify': self.teamscale_client.sslverify,
+            'connect_timeout': self.teamscale_client.connect_timeout,
+            'read_timeout': self.teamscale_client.read_timeout,
+            'max_retries': self.teamscale_client.max_retries,
+            'database_file': self.findings_mirror.database_file,
+            'branch': self.current_branch,
+            'commit': commit_sha,
+            'uniform_path': self.path_prefix + self.project_subpath
+        }
+
+    def _iter_all_existing_findings(self):
+        """Streams all existing findings in the repository, leaving out precommit findings. Findings are yielded while
+        they are downloaded, so they are not kept in `existing_findings`."""
+        if self.changed_files or self.deleted_files:
+            self.teamscale_client.branch = self._get_precommit_branch()
+        else:
+            self.teamscale_client.branch = self.current_branch
+        findings = self.teamscale_client.iter_findings(uniform_path=self.path_prefix + self.project_subpath,
+                                                       timestamp=None, revision_id=self._get_commit_hash(),
+                                                       assessments=self.assessment_filter,
+                                                       categories=self.category_filter)
+        return (finding for finding in findings if not self._is_precommit_finding(finding))
 
     def _remove_precommit_findings_from_existing_findings(self):
         """Ensures no precommit findings are among the existing findings."""
-        self.existing_findings = [finding for finding in self.existing_findings if finding not in self.added_findings
-                                  and finding not in self.removed_findings
-                                  and finding not in self.findings_in_changed_code]
+        self.existing_findings = FindingsStore(finding for finding in self.existing_findings
+                                               if not self._is_precommit_finding(finding))
+
+    def _is_precommit_finding(self, finding):
+        """Returns whether the given finding is among the precommit findings."""
+        return (finding in self.added_findings or finding in self.removed_findings
+                or finding in self.findings_in_changed_code)
 
     def _get_existing_findings_in_changes(self):
         """Gets the existing findings in the changed files."""
         self.teamscale_client.branch = self._get_precommit_branch()
-        self.existing_findings = []
+        self.existing_findings = FindingsStore()
         for uniform_path in self.changed_files:
             uniform_path = os.path.join(self.path_prefix, uniform_path)
-            self.existing_findings.extend(self.teamscale_client.get_findings(uniform_path=uniform_path, timestamp=None))
+            self.existing_findings.extend(self.teamscale_client.get_findings(uniform_path=uniform_path, timestamp=None,
+                                                                             assessments=self.assessment_filter,
+                                                                             categories=self.category_filter))
         self._remove_precommit_findings_from_existing_findings()
 
     def _format_findings(self, findings, branch):
-        """Formats the given findings as error or warning strings."""
+        """Lazily formats the given findings as error or warning strings. Unless sorting is disabled, the findings are
+        sorted by location first, spilling to disk for large amounts of findings."""
+        self.teamscale_client.branch = branch
+
+        if self.sort_findings:
+            findings = sort_externally(findings, key=self._get_finding_sort_key)
+
+        has_findings = False
+        for finding in findings:
+            has_findings = True
+            yield self._format_message(finding)
+        if not has_findings:
+            yield '> No findings.'
+
+    @staticmethod
+    def _get_finding_sort_key(finding):
+        """Returns the key by which findings are sorted for output."""
+        return finding.uniformPath, finding.startLine, finding.endLine
+
+    def _format_changes_since_last_run(self, history_section, findings, branch):
+        """Formats the given findings that are new since the last run as error or warning strings, followed by the
+        findings resolved since the last run and a summary."""
         self.teamscale_client.branch = branch
 
-        if len(findings) == 0:
-            return ['> No findings.']
+        formatted_findings = [self._format_message(finding) for finding in sorted(findings,
+                                                                                  key=self._get_finding_sort_key)]
+        new_findings, resolved_findings = self.findings_history.compare(history_section, formatted_findings)
+        resolved_messages = [self._format_resolved_message(finding) for finding in resolved_findings]
+        summary = '> %i new, %i resolved, %i unchanged since last run.' % (
+            len(new_findings), len(resolved_findings), len(formatted_findings) - len(new_findings))
+        return new_findings + resolved_messages + [summary]
 
-        sorted_findings = sorted(findings)
-        return [self._format_message(finding) for finding in sorted_findings]
+    @staticmethod
+    def _format_resolved_message(formatted_finding):
+        """Formats a resolved finding such that editors do not mistake it for an error or warning."""
+        return '> Resolved: %s' % re.sub(r':1: (error|warning): ', ': ', formatted_finding, count=1)
 
     def _format_message(self, finding):
         location = os.path.join(self.repository_path, finding.uniformPath)
         severity = self._get_finding_severity_message(finding=finding)
-        link = '%s&t=%s' % (self.teamscale_client.get_finding_url(finding),
-                            self.teamscale_client._get_timestamp_parameter(timestamp=None))
 
         message = finding.message
         if not self.omit_links_to_findings:
@@ -251,12 +724,17 @@ class PrecommitClient:
         if self.omit_links_to_findings:
             return message
 
-        return '%s | (%s)' % (message, link)
+        return '%s | (%s)' % (message, self._get_finding_link(finding))
+
+    def _get_finding_link(self, finding):
+        """Returns the link to the given finding in the Teamscale UI."""
+        return '%s&t=%s' % (self.teamscale_client.get_finding_url(finding),
+                            self.teamscale_client._get_timestamp_parameter(timestamp=None))
 
     def _copy_finding_without_path_prefix(self, finding):
-        finding_without_path_prefix = copy.deepcopy(finding)
-        finding_without_path_prefix.uniformPath = self._remove_path_prefix(finding_without_path_prefix.uniformPath)
-        return finding_without_path_prefix
+        if not self.path_prefix:
+            return finding
+        return finding.with_uniform_path(self._remove_path_prefix(finding.uniformPath))
 
     def _remove_path_prefix(self, path):
         if path.startswith(self.path_prefix):
@@ -270,14 +748,21 @@ class PrecommitClient:
 
     def _get_commit_hash(self):
         """Obtains the current commit SHA"""
+        if self.replayed_recording is not None:
+            return self.replayed_recording.manifest['commit']
         return get_current_commit_sha(self.repository_path)
 
+    def _get_client_state_dir(self):
+        """Obtains the directory in which the client keeps state between runs."""
+        return get_client_state_dir(self.repository_path)
+
 
 def _parse_args():
     """Parses the precommit client command line arguments."""
     parser = argparse.ArgumentParser(description='Precommit analysis client for Teamscale.')
-    parser.add_argument('path', metavar='path', type=str, nargs=1,
-                        help='path to any file in the repository')
+    parser.add_argument('path', metavar='path', type=str, nargs='+',
+                        help='path to any file in the repository. With --fetch-existing-findings, several files (in '
+                             'the same repository) can be given to fetch the existing findings in all of them')
     parser.add_argument('--exclude-findings-in-changed-code', dest='exclude_findings_in_changed_code',
                         action='store_const', const=True, default=False,
                         help='Determines whether to exclude findings in changed code (default: False)')
@@ -324,6 +809,108 @@ def _parse_args():
                              '(git submodules) in the current repository when determining which files changed. This '
                              'affects the files considered for precommit analysis. It does not affect the retrieval '
                              'of "existing" findings from the Teamscale server.')
+    parser.add_argument('--connect-timeout', metavar='SECONDS', type=float, default=DEFAULT_CONNECT_TIMEOUT_IN_SECONDS,
+                        help='Seconds to wait for a connection to the Teamscale server. (default: %(default)s)')
+    parser.add_argument('--read-timeout', metavar='SECONDS', type=float, default=DEFAULT_READ_TIMEOUT_IN_SECONDS,
+                        help='Seconds to wait for data from the Teamscale server once connected. '
+                             '(default: %(default)s)')
+    parser.add_argument('--retries', dest='max_retries', metavar='RETRIES', type=int, default=DEFAULT_MAX_RETRIES,
+                        help='How often failed requests for findings are retried with a randomized backoff. '
+                             '(default: %(default)s)')
+    parser.add_argument('--hedge-percentile', dest='hedging_percentile', metavar='PERCENTILE', type=float,
+                        default=None,
+                        help='When this option is set, a duplicate request is sent if a request for findings takes '
+                             'longer than the given percentile (0-100) of the response times observed so far. The '
+                             'first response is used. (default: no duplicate requests)')
+    parser.add_argument('--deadline', metavar='SECONDS', type=float, default=None,
+                        help='Overall number of seconds the client may spend waiting for the Teamscale server. When '
+                             'it passes, the findings retrieved so far are printed and the client exits with status '
+                             '%i. (default: no deadline)' % EXIT_CODE_DEADLINE_EXCEEDED)
+    parser.add_argument('--only-changed-findings', dest='only_changed_findings', action='store_const', const=True,
+                        default=False,
+                        help='When this option is set, only findings that are new or resolved since the previous run '
+                             'on the current branch are printed, followed by a summary. (default: False)')
+    parser.add_argument('--no-sorting', dest='sort_findings', action='store_false',
+                        help='When this option is set, findings are printed in the order they are retrieved from '
+                             'Teamscale instead of being sorted by location. Together with --fetch-all-findings, this '
+                             'prints the first findings as soon as they arrive. (default: False)')
+    parser.add_argument('--assessment-filter', dest='assessment_filter', metavar='ASSESSMENTS',
+                        type=_comma_separated_list, default=None,
+                        help='Comma-separated list of assessments (e.g. RED,YELLOW). When this option is set, only '
+                             'findings with one of these assessments are fetched and printed. (default: all)')
+    parser.add_argument('--category-filter', dest='category_filter', metavar='CATEGORIES',
+                        type=_comma_separated_list, default=None,
+                        help='Comma-separated list of finding categories. When this option is set, only findings in '
+                             'one of these categories are fetched and printed. (default: all)')
+    parser.add_argument('--hook', dest='hook_mode', action='store_const', const=True, default=False,
+                        help='Use this option when running the client as git pre-commit hook. Only the staged changes '
+                             'are analyzed, reading their content from the git index instead of the working tree. '
+                             'Implies --fail-on-red-findings. Results are polled every %s seconds. Unless --deadline '
+                             'is given, the client gives up after %i seconds without blocking the commit, which is '
+                             'usually enough for the server to analyze small changes. (default: False)'
+                             % (PrecommitClient.HOOK_PRECOMMIT_WAITING_TIME_IN_SECONDS,
+                                DEFAULT_HOOK_DEADLINE_IN_SECONDS))
+    parser.add_argument('--include-subrepositories', dest='include_subrepositories', action='store_const',
+                        const=True, default=False,
+                        help='When this option is set, changes inside subrepositories (git submodules) are included in '
+                             'the precommit analysis. All submodules are examined concurrently. Takes precedence over '
+                             '--ignore-subrepositories. (default: False)')
+    parser.add_argument('--subrepository-workers', dest='subrepository_workers', metavar='WORKERS', type=int,
+                        default=DEFAULT_SUBREPOSITORY_WORKERS,
+                        help='Maximum number of subrepositories examined at the same time with '
+                             '--include-subrepositories. (default: %(default)s)')
+    parser.add_argument('--supersede-previous-runs', dest='supersede_previous_runs', action='store_const',
+                        const=True, default=False,
+                        help='When this option is set, runs of the client that are still in progress in the same '
+                             'repository stop as soon as this run starts, so that only the newest changes are '
+                             'uploaded and waited for. Useful if your editor runs the client on every save. '
+                             '(default: False)')
+    parser.add_argument('--findings-mirror', dest='use_findings_mirror', action='store_const', const=True,
+                        default=False,
+                        help='When this option is set together with --fetch-existing-findings, all findings of the '
+                             'current commit are mirrored to a local database in the background. Once the mirror is '
+                             'complete, existing findings are taken from it instead of the server. (default: False)')
+    parser.add_argument('--findings-mirror-max-age', dest='findings_mirror_max_age', metavar='SECONDS', type=float,
+                        default=DEFAULT_FINDINGS_MIRROR_MAX_AGE_IN_SECONDS,
+                        help='Number of seconds after which the findings mirror is refreshed even if the current '
+                             'commit did not change. (default: %(default)s)')
+    parser.add_argument('--response-cache', dest='use_response_cache', action='store_const', const=True,
+                        default=False,
+                        help='When this option is set, findings responses are cached on disk. They are revalidated '
+                             'with conditional requests if the server supports them; otherwise, findings of a commit '
+                             'are reused without contacting the server. (default: False)')
+    parser.add_argument('--response-cache-size', dest='response_cache_size', metavar='MEGABYTES', type=int,
+                        default=DEFAULT_RESPONSE_CACHE_SIZE_IN_MEGABYTES,
+                        help='Size of the response cache above which the least recently used responses are evicted. '
+                             '(default: %(default)s)')
+    parser.add_argument('--skip-unanalyzed-files', dest='skip_unanalyzed_files', action='store_const', const=True,
+                        default=False,
+                        help='When this option is set, changed files that the Teamscale project does not analyze are '
+                             'neither read nor uploaded. The included and excluded file patterns are taken from the '
+                             'included_files and excluded_files entries in the [project] section of the configuration '
+                             'file or, if there are none, from the project configuration on the server. '
+                             '(default: False)')
+    parser.add_argument('--format', dest='output_format', choices=[OUTPUT_FORMAT_TEXT, OUTPUT_FORMAT_JSONL],
+                        default=OUTPUT_FORMAT_TEXT,
+                        help='Output format of the findings. With "%s", every finding is printed as soon as it is '
+                             'available as a JSON object on a line of its own, with the keys path, line, assessment, '
+                             'message, findingId, section and link. All other messages are printed to stderr, and '
+                             '--only-changed-findings is ignored. Combine it with --no-sorting to receive findings '
+                             'while they are downloaded. (default: %%(default)s)' % OUTPUT_FORMAT_JSONL)
+    parser.add_argument('--record', dest='record_file', metavar='FILE', default=None,
+                        help='Records all requests to Teamscale with their responses and latencies, together with a '
+                             'manifest of the analyzed git snapshot, to the given file. Finding messages and the '
+                             'uploaded source code are not recorded. (default: no recording)')
+    parser.add_argument('--replay', dest='replay_file', metavar='FILE', default=None,
+                        help='Replays a recording made with --record instead of contacting Teamscale and examining '
+                             'the repository, e.g. to profile a slow run offline. (default: no replay)')
+    parser.add_argument('--replay-latency-scale', dest='replay_latency_scale', metavar='FACTOR', type=float,
+                        default=1.0,
+                        help='Factor applied to the recorded latencies when replaying, e.g. 0 to replay without '
+                             'delays. (default: %(default)s)')
+    parser.add_argument('--profile', dest='profile', action='store_const', const=True, default=False,
+                        help='When this option is set, statistics about the requests sent to Teamscale and the '
+                             'response cache are printed to stderr. (default: False)')
     return parser.parse_args()
 
 
@@ -336,12 +923,22 @@ def _bool_or_string(string):
     return string
 
 
+def _comma_separated_list(string):
+    """Helper to interpret a comma-separated list of values."""
+    return [value.strip() for value in string.split(',') if value.strip()]
+
+
 def _configure_precommit_client(parsed_args):
     """Reads the precommit analysis configuration and creates a precommit client with the corresponding config."""
     path_to_file_in_repo = parsed_args.path[0]
+    analyzed_files = [os.path.abspath(path) for path in parsed_args.path]
     repo_path = get_repo_root_from_file_in_repo(os.path.normpath(path_to_file_in_repo))
     config_file = os.path.join(repo_path, PRECOMMIT_CONFIG_FILENAME)
     config = get_teamscale_client_configuration(config_file)
+    if parsed_args.hook_mode:
+        parsed_args.fail_on_red_findings = True
+        if parsed_args.deadline is None:
+            parsed_args.deadline = DEFAULT_HOOK_DEADLINE_IN_SECONDS
     return PrecommitClient(config, repository_path=repo_path, path_prefix=parsed_args.path_prefix,
                            project_subpath=parsed_args.project_subpath, analyzed_file=path_to_file_in_repo,
                            verify=parsed_args.verify, omit_links_to_findings=parsed_args.omit_links_to_findings,
@@ -352,11 +949,67 @@ def _configure_precommit_client(parsed_args):
                            fail_on_red_findings=parsed_args.fail_on_red_findings,
                            log_to_stderr=parsed_args.log_to_stderr,
                            file_encoding=parsed_args.file_encoding,
-                           ignore_subrepositories=parsed_args.ignore_subrepositories)
+                           ignore_subrepositories=parsed_args.ignore_subrepositories,
+                           connect_timeout=parsed_args.connect_timeout, read_timeout=parsed_args.read_timeout,
+                           max_retries=parsed_args.max_retries, hedging_percentile=parsed_args.hedging_percentile,
+                           deadline=parsed_args.deadline, only_changed_findings=parsed_args.only_changed_findings,
+                           sort_findings=parsed_args.sort_findings, assessment_filter=parsed_args.assessment_filter,
+                           category_filter=parsed_args.category_filter, hook_mode=parsed_args.hook_mode,
+                           include_subrepositories=parsed_args.include_subrepositories,
+                           subrepository_workers=parsed_args.subrepository_workers,
+                           supersede_previous_runs=parsed_args.supersede_previous_runs,
+                           use_findings_mirror=parsed_args.use_findings_mirror,
+                           findings_mirror_max_age=parsed_args.findings_mirror_max_age,
+                           use_response_cache=parsed_args.use_response_cache,
+                           response_cache_size=parsed_args.response_cache_size, profile=parsed_args.profile,
+                           skip_unanalyzed_files=parsed_args.skip_unanalyzed_files,
+                           output_format=parsed_args.output_format, analyzed_files=analyzed_files,
+                           record_file=parsed_args.record_file, replay_file=parsed_args.replay_file,
+                           replay_latency_scale=parsed_args.replay_latency_scale)
+
+
+def _spawn_findings_mirror_sync(job):
+    """Starts a detached process of the client that performs the given findings mirror sync. The job contains the
+    access token, so it is passed on stdin instead of the command line."""
+    if '__compiled__' in globals():
+        # Native binary built with Nuitka
+        command = [sys.argv[0], FINDINGS_MIRROR_SYNC_ARGUMENT]
+    else:
+        command = [sys.executable, '-m', 'teamscale_precommit_client.precommit_client', FINDINGS_MIRROR_SYNC_ARGUMENT]
+    environment = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, environment.get('PYTHONPATH')]))
+    if os.name == 'nt':
+        detach_options = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach_options = {'start_new_session': True}
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               close_fds=True, env=environment, **detach_options)
+    process.stdin.write(json.dumps(job).encode('utf-8'))
+    process.stdin.close()
+
+
+def _sync_findings_mirror(job):
+    """Replaces the mirrored findings with all findings at the commit of the given sync job, streamed from the
+    server. If the sync fails, its claim is released, so that the next run tries again."""
+    findings_mirror = FindingsMirror(job['database_file'])
+    try:
+        teamscale_client = PrecommitTeamscaleClient(job['url'], job['username'], job['access_token'], job['project'],
+                                                    job['verify'], connect_timeout=job['connect_timeout'],
+                                                    read_timeout=job['read_timeout'], max_retries=job['max_retries'])
+        findings = teamscale_client.iter_findings(uniform_path=job['uniform_path'], timestamp=None,
+                                                  revision_id=job['commit'])
+        findings_mirror.replace_findings(job['branch'], job['commit'], findings)
+    except Exception:
+        findings_mirror.release_sync(job['branch'], job['commit'])
+        raise
 
 
 def run():
     """Performs precommit analysis."""
+    if sys.argv[1:] == [FINDINGS_MIRROR_SYNC_ARGUMENT]:
+        _sync_findings_mirror(json.loads(sys.stdin.read()))
+        return
     parsed_args = _parse_args()
     precommit_client = _configure_precommit_client(parsed_args)
     precommit_client.run()
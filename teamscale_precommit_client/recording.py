@@ -0,0 +1,164 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import json
+import threading
+import time
+
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter, DEFAULT_POOLSIZE
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+try:
+    from urllib.parse import urlsplit, parse_qsl, urlencode
+except ImportError:
+    # Python 2
+    from urlparse import urlsplit, parse_qsl
+    from urllib import urlencode
+
+# Keys of JSON response bodies whose (free text) values are anonymised when recording.
+_ANONYMISED_KEYS = ('message', 'description')
+# Response headers that are not recorded: cookies may contain session secrets, and the recorded body is neither
+# encoded nor of the original length.
+_UNRECORDED_HEADERS = ('set-cookie', 'content-encoding', 'content-length', 'transfer-encoding')
+
+
+class UnrecordedRequestError(Exception):
+    """Raised when replaying a request for which the recording contains no response."""
+
+
+def _anonymise(value):
+    """Replaces the free text in the given JSON value by placeholders of the same length, so that response sizes are
+    kept."""
+    if isinstance(value, dict):
+        return dict((key, 'x' * len(item) if key in _ANONYMISED_KEYS and isinstance(item, type(''))
+                     else _anonymise(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [_anonymise(item) for item in value]
+    return value
+
+
+def _anonymise_body(body):
+    """Anonymises the given response body if it is JSON and returns it unchanged otherwise."""
+    try:
+        return json.dumps(_anonymise(json.loads(body)), separators=(',', ':'))
+    except ValueError:
+        return body
+
+
+def _get_request_key(method, url):
+    """Returns the key by which recorded exchanges are matched to requests. The server is left out, so that a
+    recording can be replayed against any configured server URL, and query parameters are sorted."""
+    parts = urlsplit(url)
+    return '%s %s?%s' % (method, parts.path, urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True))))
+
+
+class Recording(object):
+    """HTTP exchanges of a run of the client together with a manifest of the git snapshot it analyzed."""
+
+    def __init__(self, exchanges=None, manifest=None):
+        """Constructor
+
+        Args:
+            exchanges (List[dict]): The recorded exchanges in the order the responses were received.
+            manifest (dict): The branch, commit and changes of the analyzed git snapshot.
+        """
+        self.exchanges = exchanges or []
+        self.manifest = manifest or {}
+
+    @staticmethod
+    def load(recording_file):
+        """Loads a recording saved with `save`."""
+        with io.open(recording_file, encoding='utf-8') as recording:
+            recording_json = json.load(recording)
+        return Recording(recording_json['exchanges'], recording_json['manifest'])
+
+    def save(self, recording_file):
+        """Saves the recording to the given file."""
+        with io.open(recording_file, 'w', encoding='utf-8') as recording:
+            recording.write(json.dumps({'manifest': self.manifest, 'exchanges': self.exchanges}, indent=1))
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Transport adapter that sends requests to the server and records each exchange with its latency.
+
+    Response bodies are anonymised before they are recorded. Request bodies, which contain the uploaded source code,
+    are not recorded, only their size.
+    """
+
+    def __init__(self, recording, pool_maxsize=DEFAULT_POOLSIZE):
+        """Constructor
+
+        Args:
+            recording (Recording): The recording to which exchanges are added.
+            pool_maxsize (int): The number of connections kept open to the server.
+        """
+        super(RecordingAdapter, self).__init__(pool_maxsize=pool_maxsize)
+        self.recording = recording
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        start = time.time()
+        response = super(RecordingAdapter, self).send(request, **kwargs)
+        # Downloads the whole body, even for streamed requests, to record the full latency
+        body = response.content.decode('utf-8', 'replace')
+        exchange = {
+            'request': _get_request_key(request.method, request.url),
+            'request_size': len(request.body or ''),
+            'status': response.status_code,
+            'headers': dict((header, value) for header, value in response.headers.items()
+                            if header.lower() not in _UNRECORDED_HEADERS),
+            'body': _anonymise_body(body),
+            'latency': time.time() - start
+        }
+        with self._lock:
+            self.recording.exchanges.append(exchange)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter that answers requests with the exchanges of a recording instead of contacting a server.
+
+    Requests are matched by method, path and query. Identical requests (e.g. polls) receive the recorded responses in
+    order, the last one being repeated once they are used up. Each response is delayed by its recorded latency
+    multiplied by the latency scale, e.g. 0 to replay as fast as possible.
+    """
+
+    def __init__(self, recording, latency_scale=1.0):
+        """Constructor
+
+        Args:
+            recording (Recording): The recording to replay.
+            latency_scale (float): Factor applied to the recorded latencies.
+        """
+        super(ReplayAdapter, self).__init__()
+        self.latency_scale = latency_scale
+        self._exchanges_by_request = {}
+        for exchange in recording.exchanges:
+            self._exchanges_by_request.setdefault(exchange['request'], []).append(exchange)
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        request_key = _get_request_key(request.method, request.url)
+        with self._lock:
+            exchanges = self._exchanges_by_request.get(request_key)
+            if not exchanges:
+                raise UnrecordedRequestError('No recorded response for request: %s' % request_key)
+            exchange = exchanges.pop(0) if len(exchanges) > 1 else exchanges[0]
+
+        if self.latency_scale > 0:
+            time.sleep(exchange['latency'] * self.latency_scale)
+
+        response = Response()
+        response.status_code = exchange['status']
+        response.headers = CaseInsensitiveDict(exchange['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(exchange['body'].encode('utf-8'))
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,165 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Name of the cache directory in the client state directory.
+_CACHE_DIRNAME = 'response-cache'
+DEFAULT_MAX_CACHE_SIZE_IN_BYTES = 64 * 1024 * 1024
+
+# Response headers kept with a cached body. The validators are sent back to revalidate the body.
+_VALIDATOR_HEADERS = (('ETag', 'If-None-Match'), ('Last-Modified', 'If-Modified-Since'))
+_STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def has_validators(response):
+    """Returns whether the given response can be revalidated with the server, i.e. has an ETag or Last-Modified
+    header."""
+    return any(response_header in response.headers for response_header, _ in _VALIDATOR_HEADERS)
+
+
+class CachedResponse(object):
+    """Body and headers of a successful GET response stored in the cache."""
+
+    def __init__(self, headers, content, immutable):
+        """Constructor
+
+        Args:
+            headers (dict): The stored response headers.
+            content (bytes): The response body.
+            immutable (bool): Whether the response never changes and can be used without revalidation.
+        """
+        self.headers = headers
+        self.content = content
+        self.immutable = immutable
+
+    def get_validators(self):
+        """Returns the request headers that make the server answer with 304 if the cached body is still current."""
+        return dict((request_header, self.headers[response_header])
+                    for response_header, request_header in _VALIDATOR_HEADERS if response_header in self.headers)
+
+    def to_response(self, url):
+        """Returns a response for the given url with the cached body, as if it had been sent by the server."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.content
+        response.encoding = 'utf-8'
+        return response
+
+
+class ResponseCache(object):
+    """Size-bounded disk cache of GET responses with least recently used eviction.
+
+    Responses are only stored if they are immutable or can be revalidated with an ETag or Last-Modified header. Each
+    entry is a single file whose modification time is updated on every access, so the least recently used entries
+    are evicted first once the cache grows beyond its maximum size. The cache counts hits and misses for profiling.
+    """
+
+    def __init__(self, cache_dir, max_size_in_bytes=DEFAULT_MAX_CACHE_SIZE_IN_BYTES):
+        """Constructor
+
+        Args:
+            cache_dir (str): The directory holding the cache entries. It is created if it does not exist.
+            max_size_in_bytes (int): The size of all entries above which entries are evicted.
+        """
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.cache_dir = cache_dir
+        self.max_size_in_bytes = max_size_in_bytes
+        self.hits = 0
+        self.revalidated_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def for_repository(state_dir, max_size_in_bytes=DEFAULT_MAX_CACHE_SIZE_IN_BYTES):
+        """Returns the cache of the repository with the given client state directory."""
+        return ResponseCache(os.path.join(state_dir, _CACHE_DIRNAME), max_size_in_bytes)
+
+    @staticmethod
+    def get_key(*parts):
+        """Returns the cache key identifying a request by the given JSON serializable parts."""
+        serialized_parts = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha1(serialized_parts.encode('utf-8')).hexdigest()
+
+    def lookup(self, key):
+        """Returns the cached response for the given key or `None` if there is none. Marks the entry as recently
+        used."""
+        entry_file = self._get_entry_file(key)
+        try:
+            with open(entry_file, 'rb') as entry:
+                headers, content, immutable = pickle.load(entry)
+            os.utime(entry_file, None)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+        return CachedResponse(headers, content, immutable)
+
+    def store(self, key, response, immutable=False):
+        """Stores the given response under the given key if it is successful and either immutable or revalidatable.
+        Evicts the least recently used entries afterwards if the cache is too large."""
+        headers = dict((header, response.headers[header]) for header in _STORED_HEADERS if header in response.headers)
+        if response.status_code != 200 or not (immutable or CachedResponse(headers, None, False).get_validators()):
+            return
+        # Entries are written atomically, so that concurrent readers never see partial entries
+        file_descriptor, temporary_file = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(file_descriptor, 'wb') as entry:
+            pickle.dump((headers, response.content, immutable), entry, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_file, self._get_entry_file(key))
+        self._evict()
+
+    def record_hit(self, revalidated=False):
+        """Counts a request answered from the cache, after revalidation with the server if `revalidated` is set."""
+        with self._lock:
+            self.hits += 1
+            if revalidated:
+                self.revalidated_hits += 1
+
+    def record_miss(self):
+        """Counts a request whose response had to be downloaded."""
+        with self._lock:
+            self.misses += 1
+
+    def get_hit_rate(self):
+        """Returns the fraction of requests answered from the cache or `None` if there were no requests."""
+        requests_count = self.hits + self.misses
+        if requests_count == 0:
+            return None
+        return float(self.hits) / requests_count
+
+    def _get_entry_file(self, key):
+        """Returns the file holding the entry with the given key."""
+        return os.path.join(self.cache_dir, key)
+
+    def _evict(self):
+        """Deletes the least recently used entries until the cache is no larger than its maximum size."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.tmp'):
+                # Entry still being written
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                # Concurrently evicted
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, name in sorted(entries):
+            if size <= self.max_size_in_bytes:
+                return
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            size -= entry_size
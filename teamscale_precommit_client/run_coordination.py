@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import time
+import uuid
+from io import open
+
+# Name of the file in the client state directory that identifies the newest run.
+_CURRENT_RUN_FILENAME = 'current-run'
+# How often replacing the run file is attempted. On Windows, it cannot be replaced while another run reads it.
+_REPLACE_ATTEMPTS = 20
+_REPLACE_RETRY_DELAY_IN_SECONDS = 0.05
+
+
+class RunSupersededError(Exception):
+    """Raised when a newer run of the client was started in the same repository."""
+
+
+class RunCoordinator(object):
+    """Coordinates concurrent runs of the client in the same repository, e.g. when an editor triggers a new run on
+    every save while the previous one is still waiting for results.
+
+    Every run registers itself by writing its id to a run file in the client state directory, superseding all earlier
+    runs. Earlier runs check the file regularly and stop as soon as another run has registered. The file is never
+    deleted, as a run cannot delete it without possibly deleting the id of a newer run that earlier runs have not seen
+    yet.
+    """
+
+    def __init__(self, run_file):
+        """Constructor
+
+        Args:
+            run_file (str): The file that contains the id of the newest run.
+        """
+        self.run_file = run_file
+        self.run_id = '%i-%s' % (os.getpid(), uuid.uuid4().hex)
+
+    @staticmethod
+    def for_repository(state_dir):
+        """Returns a coordinator for the repository with the given client state directory."""
+        return RunCoordinator(os.path.join(state_dir, _CURRENT_RUN_FILENAME))
+
+    def register(self):
+        """Registers this run as the newest one, superseding all earlier runs."""
+        run_dir = os.path.dirname(self.run_file)
+        if not os.path.isdir(run_dir):
+            os.makedirs(run_dir)
+        # Write to a temporary file first, so that other runs never read a partially written id
+        temporary_file = '%s.%s' % (self.run_file, self.run_id)
+        with open(temporary_file, 'w', encoding='utf-8') as file:
+            file.write(self.run_id)
+        try:
+            self._replace_run_file(temporary_file)
+        except OSError:
+            os.remove(temporary_file)
+            raise
+
+    def _replace_run_file(self, temporary_file):
+        """Replaces the run file with the given file. Earlier runs only open the run file briefly to read it, so
+        replacing it is retried for a while if it fails because the file is open."""
+        for attempt in range(_REPLACE_ATTEMPTS):
+            try:
+                os.replace(temporary_file, self.run_file)
+                return
+            except PermissionError:
+                if attempt == _REPLACE_ATTEMPTS - 1:
+                    raise
+                time.sleep(_REPLACE_RETRY_DELAY_IN_SECONDS)
+
+    def is_superseded(self):
+        """Returns whether a newer run has registered since this run registered."""
+        newest_run_id = self._read_newest_run_id()
+        return newest_run_id is not None and newest_run_id != self.run_id
+
+    def check(self):
+        """Raises `RunSupersededError` if a newer run has registered since this run registered."""
+        if self.is_superseded():
+            raise RunSupersededError()
+
+    def _read_newest_run_id(self):
+        """Returns the id of the newest run or `None` if no run is registered."""
+        try:
+            with open(self.run_file, encoding='utf-8') as file:
+                return file.read()
+        except (IOError, OSError):
+            return None
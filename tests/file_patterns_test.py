@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from teamscale_precommit_client.file_patterns import FilePatterns
+
+
+class FilePatternsTest(unittest.TestCase):
+    """ Unit tests for file_patterns.py """
+
+    def test_match_ant_patterns(self):
+        """ Test that ant patterns match whole paths, with `**` spanning directories and `*` not """
+        patterns = FilePatterns([(['**.java', 'src/*.py', 'docs/'], ['**/generated/**', '**/*Test.java'])])
+
+        self.assertTrue(patterns.matches('Main.java'))
+        self.assertTrue(patterns.matches('src/main/Main.java'))
+        self.assertTrue(patterns.matches('src/main.py'))
+        self.assertTrue(patterns.matches('docs/index.md'))
+        self.assertFalse(patterns.matches('src/sub/main.py'))
+        self.assertFalse(patterns.matches('src/generated/Main.java'))
+        self.assertFalse(patterns.matches('src/MainTest.java'))
+        self.assertFalse(patterns.matches('Main.javax'))
+
+    def test_match_any_connector(self):
+        """ Test that files are analyzed if any connector includes them and that no patterns include all files """
+        patterns = FilePatterns([(['**.java'], []), ([], ['**.java'])])
+
+        self.assertTrue(patterns.matches('Main.java'))
+        self.assertTrue(patterns.matches('README.md'))
+        self.assertTrue(FilePatterns([]).matches('README.md'))
+
+    def test_read_patterns_from_project_configuration(self):
+        """ Test that the patterns of all connectors are read from the project configuration """
+        patterns = FilePatterns.from_project_configuration({'connectors': [
+            {'type': 'Git', 'options': {'Included file names': '**.java, **.kt', 'Excluded file names': '**/test/**'}},
+            {'type': 'Git', 'options': {'Included file names': '**.py\n**.pyi'}}]})
+
+        self.assertEqual(patterns.pattern_sets, [(['**.java', '**.kt'], ['**/test/**']), (['**.py', '**.pyi'], [])])
+
+    def test_read_patterns_from_config_file(self):
+        """ Test that patterns are read from the configuration file if it defines any """
+        config_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, config_dir)
+        config_file = os.path.join(config_dir, 'config')
+        with open(config_file, 'w') as config:
+            config.write('[project]\nid = project\nincluded_files = **.py\n')
+
+        self.assertEqual(FilePatterns.from_config_file(config_file).pattern_sets, [(['**.py'], [])])
+
+        with open(config_file, 'w') as config:
+            config.write('[project]\nid = project\n')
+        self.assertIsNone(FilePatterns.from_config_file(config_file))
+
+    def test_cache_patterns_per_project(self):
+        """ Test that cached patterns are only used for the same project and while they are not too old """
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache_file = os.path.join(cache_dir, 'state', 'file-patterns.json')
+        FilePatterns([(['**.py'], [])]).save(cache_file, 'project')
+
+        self.assertEqual(FilePatterns.load(cache_file, 'project', 60).pattern_sets, [(['**.py'], [])])
+        self.assertIsNone(FilePatterns.load(cache_file, 'other-project', 60))
+        self.assertIsNone(FilePatterns.load(cache_file, 'project', -1))
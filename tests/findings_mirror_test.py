@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from teamscale_precommit_client.findings_mirror import FindingsMirror
+from teamscale_precommit_client.findings_store import CompactFinding
+
+
+class FindingsMirrorTest(unittest.TestCase):
+    """ Unit tests for findings_mirror.py """
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.mirror = FindingsMirror.for_repository(os.path.join(self.state_dir, 'teamscale-cli'))
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+
+    def test_mirror_is_fresh_for_synced_commit_only(self):
+        """ Test that the mirror is only fresh for the synced commit and within the maximum age """
+        self.assertFalse(self.mirror.is_fresh('master', 'abc', 60))
+
+        self.mirror.replace_findings('master', 'abc', [self._get_finding('1', 'src/a.py')])
+
+        self.assertTrue(self.mirror.is_fresh('master', 'abc', 60))
+        self.assertFalse(self.mirror.is_fresh('master', 'def', 60))
+        self.assertFalse(self.mirror.is_fresh('feature', 'abc', 60))
+        self.assertFalse(self.mirror.is_fresh('master', 'abc', -1))
+
+    def test_get_findings_in_file_or_directory(self):
+        """ Test that findings are looked up by file and by directory, without matching sibling paths """
+        self.mirror.replace_findings('master', 'abc', [self._get_finding('1', 'src/a.py'),
+                                                       self._get_finding('2', 'src/sub/b.py'),
+                                                       self._get_finding('3', 'src-gen/c.py'),
+                                                       self._get_finding('4', 'src.py')])
+
+        self.assertEqual(self._get_ids('master', 'src/a.py'), ['1'])
+        self.assertEqual(self._get_ids('master', 'src'), ['1', '2'])
+        self.assertEqual(self._get_ids('master', 'src/'), ['1', '2'])
+        self.assertEqual(self._get_ids('master', ''), ['1', '2', '3', '4'])
+        self.assertEqual(self._get_ids('feature', ''), [])
+
+    def test_replace_findings_drops_previous_findings(self):
+        """ Test that a sync replaces all findings previously mirrored for the branch """
+        self.mirror.replace_findings('master', 'abc', [self._get_finding('1', 'src/a.py')])
+        self.mirror.replace_findings('master', 'def', [self._get_finding('2', 'src/a.py')])
+
+        self.assertEqual(self._get_ids('master', 'src/a.py'), ['2'])
+        self.assertTrue(self.mirror.is_fresh('master', 'def', 60))
+
+    def test_keep_findings_of_most_recently_synced_branches_only(self):
+        """ Test that the findings of the least recently synced branches are dropped beyond the maximum number """
+        mirror = FindingsMirror.for_repository(os.path.join(self.state_dir, 'teamscale-cli'), max_branches=2)
+        for branch in ('master', 'feature', 'master', 'bugfix'):
+            mirror.replace_findings(branch, 'abc', [self._get_finding(branch, 'src/a.py')])
+
+        self.assertEqual(self._get_ids('master', ''), ['master'])
+        self.assertEqual(self._get_ids('bugfix', ''), ['bugfix'])
+        self.assertEqual(self._get_ids('feature', ''), [])
+        self.assertFalse(mirror.is_fresh('feature', 'abc', 60))
+
+    def test_claim_sync_once_per_commit(self):
+        """ Test that a sync is only claimed once per commit until it finishes, fails or times out """
+        self.assertTrue(self.mirror.claim_sync('master', 'abc', 60))
+        self.assertFalse(self.mirror.claim_sync('master', 'abc', 60))
+        self.assertTrue(self.mirror.claim_sync('master', 'abc', -1))
+        self.assertTrue(self.mirror.claim_sync('master', 'def', 60))
+
+        self.mirror.release_sync('master', 'def')
+        self.assertTrue(self.mirror.claim_sync('master', 'def', 60))
+
+        self.mirror.replace_findings('master', 'def', [])
+        self.assertTrue(self.mirror.claim_sync('master', 'def', 60))
+
+    def _get_ids(self, branch, uniform_path):
+        """ Returns the sorted ids of the mirrored findings at the given path """
+        return sorted(finding.finding_id for finding in self.mirror.get_findings(branch, uniform_path))
+
+    @staticmethod
+    def _get_finding(finding_id, uniform_path):
+        """ Returns a finding with the given id and path """
+        return CompactFinding('type', 'message', 'RED', start_line=1, end_line=1, uniform_path=uniform_path,
+                              finding_id=finding_id)
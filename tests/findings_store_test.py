@@ -0,0 +1,47 @@
+import pickle
+import unittest
+
+from teamscale_precommit_client.findings_store import CompactFinding, FindingsStore
+
+
+class FindingsStoreTest(unittest.TestCase):
+    """ Unit tests for findings_store.py """
+
+    def test_keep_findings_in_insertion_order(self):
+        """ Test that findings are iterated in the order they were added, regardless of their paths """
+        store = FindingsStore([self._get_finding('1', 'a.py', 1), self._get_finding('2', 'b.py', 2),
+                               self._get_finding('3', 'a.py', 3)])
+
+        self.assertEqual([finding.finding_id for finding in store], ['1', '2', '3'])
+        self.assertEqual(len(store), 3)
+
+    def test_contains_compares_by_id_or_content(self):
+        """ Test that membership uses ids if both findings have one and the content otherwise """
+        store = FindingsStore([self._get_finding('1', 'a.py', 1), self._get_finding(None, 'b.py', 2)])
+
+        self.assertIn(self._get_finding('1', 'moved.py', 10), store)
+        self.assertIn(self._get_finding('2', 'b.py', 2), store)
+        self.assertNotIn(self._get_finding('3', 'a.py', 1), store)
+        self.assertNotIn(self._get_finding(None, 'b.py', 3), store)
+
+    def test_has_assessment(self):
+        """ Test that the store keeps track of the contained assessments """
+        store = FindingsStore([self._get_finding('1', 'a.py', 1, assessment='YELLOW')])
+        self.assertFalse(store.has_assessment('RED'))
+
+        store.add(self._get_finding('2', 'a.py', 2, assessment='RED'))
+        self.assertTrue(store.has_assessment('RED'))
+
+    def test_compact_finding_is_picklable(self):
+        """ Test that findings survive pickling, as they are spilled to disk when sorting many findings """
+        finding = self._get_finding('1', 'a.py', 1)
+        unpickled_finding = pickle.loads(pickle.dumps(finding, protocol=pickle.HIGHEST_PROTOCOL))
+
+        self.assertEqual(repr(unpickled_finding), repr(finding))
+        self.assertFalse(hasattr(unpickled_finding, '__dict__'))
+
+    @staticmethod
+    def _get_finding(finding_id, uniform_path, line, assessment='RED'):
+        """ Returns a finding with the given properties """
+        return CompactFinding('type', 'message', assessment, start_line=line, end_line=line,
+                              uniform_path=uniform_path, finding_id=finding_id)
@@ -0,0 +1,31 @@
+import json
+import unittest
+
+from teamscale_precommit_client.findings_stream import iter_json_array, sort_externally
+
+
+class FindingsStreamTest(unittest.TestCase):
+    """ Unit tests for findings_stream.py """
+
+    def test_decode_json_array_split_into_chunks(self):
+        """ Test that array elements are decoded regardless of where the chunk boundaries are """
+        elements = [{'id': str(i), 'message': 'mässage %i' % i, 'location': {'rawStartLine': i}} for i in
+                    range(50)]
+        encoded = json.dumps(elements, ensure_ascii=False).encode('utf-8')
+        for chunk_size in [1, 7, 64, len(encoded)]:
+            chunks = [encoded[i:i + chunk_size] for i in range(0, len(encoded), chunk_size)]
+            self.assertEqual(list(iter_json_array(chunks)), elements)
+
+    def test_decode_empty_json_array(self):
+        """ Test that an empty array yields no elements """
+        self.assertEqual(list(iter_json_array([b' [ ', b'] '])), [])
+
+    def test_reject_truncated_json_array(self):
+        """ Test that a truncated array is reported as an error """
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'[{"id": 1}, {"id"']))
+
+    def test_sort_externally_in_several_runs(self):
+        """ Test that sorting in several runs on disk yields the same result as sorting in memory """
+        items = [(i * 7919) % 1000 for i in range(1000)]
+        self.assertEqual(list(sort_externally(items, key=lambda item: item, run_size=64)), sorted(items))
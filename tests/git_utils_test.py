@@ -1,7 +1,12 @@
 import os
+import shutil
+import tempfile
 import unittest
 
-from teamscale_precommit_client.git_utils import filter_changed_files
+from git import Repo
+
+from teamscale_precommit_client.git_utils import filter_changed_files, get_staged_changes
+from teamscale_precommit_client.git_utils import get_changes_in_subrepositories
 
 
 class GitUtilsTest(unittest.TestCase):
@@ -13,3 +18,99 @@ class GitUtilsTest(unittest.TestCase):
         binary_file_name = "binary.png"
         files_for_precommit_analysis = filter_changed_files([binary_file_name], test_dir, None)
         self.assertEqual(files_for_precommit_analysis, [])
+
+    def test_get_staged_changes_from_index(self):
+        """ Test that the staged content is analyzed instead of the working tree content """
+        repo_dir, repo = self._create_repo()
+        self._write_file(repo_dir, 'modified.txt', 'old\n')
+        self._write_file(repo_dir, 'deleted.txt', 'deleted\n')
+        repo.index.add(['modified.txt', 'deleted.txt'])
+        repo.index.commit('Initial commit')
+
+        self._write_file(repo_dir, 'modified.txt', 'staged\r\n')
+        self._write_file(repo_dir, 'added.txt', 'added\n')
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'binary.png'), repo_dir)
+        repo.index.add(['modified.txt', 'added.txt', 'binary.png'])
+        repo.index.remove(['deleted.txt'], working_tree=True)
+        self._write_file(repo_dir, 'modified.txt', 'not staged\n')
+
+        changed_files, deleted_files = get_staged_changes(repo_dir, 'utf-8', True)
+        self.assertEqual(changed_files, {'modified.txt': 'staged\n', 'added.txt': 'added\n'})
+        self.assertEqual(deleted_files, ['deleted.txt'])
+
+    def test_get_changes_in_subrepositories(self):
+        """ Test that changes in submodules are detected with paths relative to the superproject """
+        submodule_dir, submodule_repo = self._create_repo()
+        self._write_file(submodule_dir, 'file.txt', 'old\n')
+        submodule_repo.index.add(['file.txt'])
+        submodule_repo.index.commit('Initial commit')
+        repo_dir, repo = self._create_repo()
+        repo.git.execute(['git', '-c', 'protocol.file.allow=always', 'submodule', 'add', submodule_dir, 'libs/sub'])
+        repo.index.commit('Add submodule')
+
+        self._write_file(os.path.join(repo_dir, 'libs', 'sub'), 'file.txt', 'new\n')
+
+        changed_files, deleted_files = get_changes_in_subrepositories(repo_dir, 'utf-8', max_workers=2)
+        self.assertEqual(changed_files, {'libs/sub/file.txt': 'new\n'})
+        self.assertEqual(deleted_files, [])
+
+    def test_get_changes_in_nested_subrepositories(self):
+        """ Test that changes in nested submodules are detected, but uninitialized submodules are skipped """
+        nested_dir, nested_repo = self._create_repo()
+        self._write_file(nested_dir, 'nested.txt', 'old\n')
+        nested_repo.index.add(['nested.txt'])
+        nested_repo.index.commit('Initial commit')
+        submodule_dir, submodule_repo = self._create_repo()
+        self._add_submodule(submodule_repo, nested_dir, 'nested')
+        submodule_repo.index.commit('Add nested submodule')
+        repo_dir, repo = self._create_repo()
+        self._add_submodule(repo, submodule_dir, 'libs/sub')
+        self._add_submodule(repo, nested_dir, 'libs/uninitialized')
+        repo.index.commit('Add submodules')
+        repo.git.execute(['git', '-c', 'protocol.file.allow=always', 'submodule', 'update', '--init', '--recursive',
+                          'libs/sub'])
+        repo.git.submodule('deinit', '--force', 'libs/uninitialized')
+
+        self._write_file(os.path.join(repo_dir, 'libs', 'sub', 'nested'), 'nested.txt', 'new\n')
+
+        changed_files, deleted_files = get_changes_in_subrepositories(repo_dir, 'utf-8', max_workers=2)
+        self.assertEqual(changed_files, {'libs/sub/nested/nested.txt': 'new\n'})
+        self.assertEqual(deleted_files, [])
+
+    def test_skip_files_rejected_by_path_filter(self):
+        """ Test that changed files rejected by the path filter are left out without reading them """
+        repo_dir, repo = self._create_repo()
+        self._write_file(repo_dir, 'main.py', 'old\n')
+        repo.index.add(['main.py'])
+        repo.index.commit('Initial commit')
+
+        self._write_file(repo_dir, 'main.py', 'new\n')
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'binary.png'), repo_dir)
+        repo.index.add(['main.py', 'binary.png'])
+
+        only_python_files = lambda path: path.endswith('.py')
+        self.assertEqual(filter_changed_files(['main.py', 'binary.png'], repo_dir, 'utf-8', only_python_files),
+                         ['main.py'])
+        changed_files, _ = get_staged_changes(repo_dir, 'utf-8', True, only_python_files)
+        self.assertEqual(changed_files, {'main.py': 'new\n'})
+
+    def _create_repo(self):
+        """ Creates an empty git repository that is deleted after the test """
+        repo_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, repo_dir, ignore_errors=True)
+        repo = Repo.init(repo_dir)
+        with repo.config_writer() as config:
+            config.set_value('user', 'name', 'John Doe')
+            config.set_value('user', 'email', 'john@example.com')
+        return repo_dir, repo
+
+    @staticmethod
+    def _add_submodule(repo, submodule_dir, path):
+        """ Adds the repository in the given directory as submodule at the given path """
+        repo.git.execute(['git', '-c', 'protocol.file.allow=always', 'submodule', 'add', submodule_dir, path])
+
+    @staticmethod
+    def _write_file(directory, name, content):
+        """ Writes the given content to a file without newline translation """
+        with open(os.path.join(directory, name), 'w', newline='') as file:
+            file.write(content)
@@ -0,0 +1,218 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import responses
+
+from teamscale_precommit_client.http_client import PrecommitTeamscaleClient, DeadlineExceededError
+from teamscale_precommit_client.response_cache import ResponseCache
+
+URL = 'http://localhost:8080'
+PROJECT = 'test_project'
+
+
+class PrecommitTeamscaleClientTest(unittest.TestCase):
+    """ Unit tests for http_client.py """
+
+    def setUp(self):
+        """ Disables backoff delays so that retries do not slow down the tests """
+        self.original_backoff = PrecommitTeamscaleClient.RETRY_BACKOFF_BASE_IN_SECONDS
+        PrecommitTeamscaleClient.RETRY_BACKOFF_BASE_IN_SECONDS = 0
+
+    def tearDown(self):
+        PrecommitTeamscaleClient.RETRY_BACKOFF_BASE_IN_SECONDS = self.original_backoff
+
+    @responses.activate
+    def test_retry_transient_server_errors(self):
+        """ Test that GET requests failing with a transient server error are retried """
+        client = self._get_client(max_retries=2)
+        responses.add(responses.GET, re.compile(r'%s/p/%s/findings/.*' % (URL, PROJECT)), status=503)
+        responses.add(responses.GET, re.compile(r'%s/p/%s/findings/.*' % (URL, PROJECT)), status=200, body='[]',
+                      content_type='application/json')
+
+        self.assertEqual(len(client.get_findings('file.ext', timestamp=None)), 0)
+        self.assertEqual(len([call for call in responses.calls if 'findings' in call.request.url]), 2)
+
+    @responses.activate
+    def test_retry_connection_errors_until_exhausted(self):
+        """ Test that connection errors are retried at most `max_retries` times """
+        client = self._get_client(max_retries=1)
+        responses.add(responses.GET, re.compile(r'%s/p/%s/findings/.*' % (URL, PROJECT)),
+                      body=requests.exceptions.ConnectionError())
+
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.get_findings('file.ext', timestamp=None)
+        self.assertEqual(len([call for call in responses.calls if 'findings' in call.request.url]), 2)
+
+    @responses.activate
+    def test_deadline_stops_polling(self):
+        """ Test that polling for precommit results stops once the deadline has passed """
+        client = self._get_client()
+        responses.add(responses.GET, re.compile(r'%s/p/%s/pre-commit/.*' % (URL, PROJECT)), status=204)
+        client.set_deadline(0.1)
+
+        with self.assertRaises(DeadlineExceededError):
+            client.get_precommit_analysis_results()
+
+    @responses.activate
+    def test_revalidate_cached_findings(self):
+        """ Test that cached findings are revalidated with their ETag and reused if the server reports no change """
+        client = self._get_client_with_response_cache()
+        responses.add(responses.GET, re.compile(r'%s/p/%s/findings/.*' % (URL, PROJECT)), status=200,
+                      body=self._get_findings_json(), content_type='application/json', headers={'ETag': '"v1"'})
+        responses.add(responses.GET, re.compile(r'%s/p/%s/findings/.*' % (URL, PROJECT)), status=304)
+
+        self.assertEqual(len(client.get_findings('file.ext', timestamp=None)), 1)
+        self.assertEqual(len(client.get_findings('file.ext', timestamp=None)), 1)
+
+        findings_requests = [call.request for call in responses.calls if 'findings' in call.request.url]
+        self.assertEqual(findings_requests[1].headers['If-None-Match'], '"v1"')
+        self.assertEqual((client.response_cache.hits, client.response_cache.misses), (1, 1))
+
+    @responses.activate
+    def test_reuse_findings_for_revision_without_request(self):
+        """ Test that findings retrieved for a revision are reused without resolving the revision again """
+        client = self._get_client_with_response_cache()
+        responses.add(responses.GET, re.compile(r'%s/p/%s/repository-timestamp-by-revision/.*' % (URL, PROJECT)),
+                      status=200, body='[{"branchName": "master", "timestamp": 1}]', content_type='application/json')
+        responses.add(responses.GET, re.compile(r'%s/p/%s/findings/.*' % (URL, PROJECT)), status=200,
+                      body=self._get_findings_json(), content_type='application/json')
+
+        client.get_findings('file.ext', timestamp=None, revision_id='abc')
+        request_count = len(responses.calls)
+        findings = client.get_findings('file.ext', timestamp=None, revision_id='abc')
+
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(len(responses.calls), request_count)
+        self.assertEqual(client.response_cache.hits, 1)
+
+    @responses.activate
+    def test_revalidate_findings_for_revision_if_supported(self):
+        """ Test that findings retrieved for a revision are revalidated if the server sends validators """
+        client = self._get_client_with_response_cache()
+        responses.add(responses.GET, re.compile(r'%s/p/%s/repository-timestamp-by-revision/.*' % (URL, PROJECT)),
+                      status=200, body='[{"branchName": "master", "timestamp": 1}]', content_type='application/json')
+        responses.add(responses.GET, re.compile(r'%s/p/%s/findings/.*' % (URL, PROJECT)), status=200,
+                      body=self._get_findings_json(), content_type='application/json', headers={'ETag': '"v1"'})
+        responses.add(responses.GET, re.compile(r'%s/p/%s/findings/.*' % (URL, PROJECT)), status=304)
+
+        client.get_findings('file.ext', timestamp=None, revision_id='abc')
+        findings = client.get_findings('file.ext', timestamp=None, revision_id='abc')
+
+        findings_requests = [call.request for call in responses.calls if '/findings/' in call.request.url]
+        self.assertEqual(len(findings), 1)
+        self.assertEqual(findings_requests[1].headers['If-None-Match'], '"v1"')
+        self.assertEqual(client.response_cache.revalidated_hits, 1)
+
+    @responses.activate
+    def test_hedged_requests_of_concurrent_callers_do_not_queue(self):
+        """ Test that hedged requests of several threads are sent at the same time instead of one after another """
+        client = self._get_client()
+        client.hedging_percentile = 100
+        client.latencies = [1.0] * PrecommitTeamscaleClient.HEDGING_MIN_SAMPLES
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def slow_get(url, parameters, headers, stream=False):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            time.sleep(0.3)
+            with lock:
+                in_flight[0] -= 1
+            return requests.Response()
+
+        client._timed_get = slow_get
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: client._hedged_get(URL, None, {}), range(8)))
+
+        self.assertEqual(in_flight[1], 8)
+        self.assertLess(time.time() - start, 0.9)
+
+    def test_exit_without_waiting_for_losing_hedged_request(self):
+        """ Test that a process using a hedged response exits without waiting for the slower request to finish """
+        script = """
+import time
+import requests
+from teamscale_precommit_client.http_client import PrecommitTeamscaleClient
+
+client = PrecommitTeamscaleClient.__new__(PrecommitTeamscaleClient)
+client.hedging_percentile = 0
+client.latencies = [0.01] * PrecommitTeamscaleClient.HEDGING_MIN_SAMPLES
+delays = [5, 0]
+
+def get(url, parameters, headers, stream=False):
+    time.sleep(delays.pop(0))
+    return requests.Response()
+
+client._timed_get = get
+client._hedged_get('http://localhost:8080', None, {})
+"""
+        environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', script], env=environment)
+        self.assertLess(time.time() - start, 4)
+
+    @responses.activate
+    def test_keep_recent_latencies_and_reset_statistics(self):
+        """ Test that only recent latencies are kept for hedging and that request statistics can be reset """
+        client = self._get_client()
+        for latency in range(PrecommitTeamscaleClient.HEDGING_MAX_SAMPLES + 10):
+            client._record_latency(latency)
+
+        self.assertEqual(len(client.latencies), PrecommitTeamscaleClient.HEDGING_MAX_SAMPLES)
+        self.assertEqual(min(client.latencies), 10)
+        self.assertEqual(client.max_latency, PrecommitTeamscaleClient.HEDGING_MAX_SAMPLES + 9)
+
+        client.reset_request_statistics()
+        client._record_latency(0.5)
+        self.assertEqual((client.request_count, client.total_latency, client.max_latency), (1, 0.5, 0.5))
+        self.assertEqual(len(client.latencies), PrecommitTeamscaleClient.HEDGING_MAX_SAMPLES)
+
+    @responses.activate
+    def test_keep_connections_for_all_concurrent_requests(self):
+        """ Test that the connection pool holds a connection for every concurrent request and its hedged duplicate """
+        client = self._get_client(max_concurrent_requests=8)
+
+        self.assertEqual(client.session.get_adapter(URL)._pool_maxsize, 16)
+
+    def test_hedging_threshold(self):
+        """ Test that hedging only starts after enough latency samples and uses the requested percentile """
+        client = PrecommitTeamscaleClient.__new__(PrecommitTeamscaleClient)
+        client.hedging_percentile = 50
+        client.latencies = [0.4, 0.1, 0.3]
+        self.assertIsNone(client._get_hedging_threshold())
+
+        client.latencies = [0.4, 0.1, 0.3, 0.2, 0.5]
+        self.assertEqual(client._get_hedging_threshold(), 0.3)
+
+    def _get_client_with_response_cache(self):
+        """ Returns a client connected to the mocked server that caches responses in a temporary directory """
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        client = self._get_client()
+        client.response_cache = ResponseCache(cache_dir)
+        return client
+
+    @staticmethod
+    def _get_findings_json():
+        """ Returns the JSON representation of a single finding """
+        return ('[{"id": "1", "typeId": "type", "message": "message", "assessment": "RED", '
+                '"location": {"uniformPath": "file.ext", "rawStartLine": 1, "rawEndLine": 1}}]')
+
+    @staticmethod
+    def _get_client(max_retries=0, max_concurrent_requests=1):
+        """ Returns a client connected to the mocked server """
+        responses.add(responses.GET, re.compile(r'%s/service-api-info/.*' % URL), status=200,
+                      content_type="application/json", body='{"apiVersion": 6}')
+        return PrecommitTeamscaleClient(URL, 'johndoe', 'secret', PROJECT, max_retries=max_retries,
+                                        max_concurrent_requests=max_concurrent_requests)
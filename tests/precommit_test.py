@@ -1,22 +1,30 @@
+import json
 import os
 import re
+import shutil
 import sys
+import tempfile
 from io import StringIO
 
 import responses
+from git import Repo
 
 from teamscale_precommit_client.precommit_client import DEFAULT_PROJECT_SUBPATH
 
 # The mock package is only available from Python 3.3 onwards. Thank you, Python.
 if sys.version_info >= (3, 3):
-    from unittest.mock import Mock
+    from unittest.mock import Mock, call, patch
 else:
     # This package is not needed in Python >= 3.3
-    from mock import Mock
+    from mock import Mock, call, patch
 from unittest import TestCase
 from teamscale_client.teamscale_client_config import TeamscaleClientConfig
-from teamscale_precommit_client import PrecommitClient
-from teamscale_precommit_client.precommit_client import DEFAULT_PATH_PREFIX
+from teamscale_precommit_client import PrecommitClient, PrecommitResult
+from teamscale_precommit_client.precommit_client import DEFAULT_PATH_PREFIX, EXIT_CODE_DEADLINE_EXCEEDED
+from teamscale_precommit_client.precommit_client import OUTPUT_FORMAT_JSONL, _sync_findings_mirror
+from teamscale_precommit_client.precommit_client import DEFAULT_HOOK_DEADLINE_IN_SECONDS, _configure_precommit_client
+from teamscale_precommit_client.precommit_client import _parse_args
+from teamscale_precommit_client.run_coordination import RunCoordinator
 from teamscale_client.utils import to_json
 
 URL = 'http://localhost:8080'
@@ -187,6 +195,43 @@ class PrecommitClientTest(TestCase):
         # so we expect it to be removed in the output
         self.assertNotIn(ANALYZED_FILE_NAME, captured_output.getvalue())
 
+    @responses.activate
+    def test_push_project_subpath_and_assessment_filter_to_server(self):
+        """Tests that the project sub-path and the assessment filter are part of the request for all findings and
+        that the assessment filter is also applied locally in case the server ignores it."""
+        project_subpath = 'project'
+        self.precommit_client = self._get_precommit_client(self._get_no_changed_files(), self._get_no_deleted_files(),
+                                                           project_subpath=project_subpath, fetch_all_findings=True)
+        self.precommit_client.assessment_filter = ['YELLOW']
+        self.mock_existing_findings(CURRENT_BRANCH, [1], path_prefix=os.path.join(project_subpath, ''))
+
+        captured_output = StringIO()
+        sys.stdout = captured_output
+
+        self.precommit_client.run()
+
+        findings_request = next(call.request for call in responses.calls if '/findings/' in call.request.url)
+        self.assertIn('/findings/%s/?' % project_subpath, findings_request.url)
+        self.assertIn('assessment-filters=YELLOW', findings_request.url)
+        # The mocked finding is RED, so it must be filtered locally
+        self.assertNotIn(ANALYZED_FILE_NAME, captured_output.getvalue())
+
+    @responses.activate
+    def test_stream_all_findings_sorted_by_location(self):
+        """Tests that all existing findings are streamed from the server and printed sorted by location."""
+        self.precommit_client = self._get_precommit_client(self._get_no_changed_files(), self._get_no_deleted_files(),
+                                                           fetch_all_findings=True)
+        self.mock_existing_findings(CURRENT_BRANCH, [12, 3, 7])
+
+        captured_output = StringIO()
+        sys.stdout = captured_output
+
+        self.precommit_client.run()
+
+        printed_lines = [int(line.split(':')[1]) for line in captured_output.getvalue().splitlines()
+                         if line.startswith(ANALYZED_FILE_PATH)]
+        self.assertListEqual(printed_lines, [3, 7, 12])
+
     @responses.activate
     def test_adding_path_prefix(self):
         path_prefix = 'prefix'
@@ -253,6 +298,378 @@ class PrecommitClientTest(TestCase):
 
         self.assertIn(path_prefix, existing_findings_request.url)
 
+    @responses.activate
+    def test_exit_with_distinct_status_when_deadline_passes(self):
+        """Tests that the client stops waiting for precommit results once the deadline has passed."""
+        self.precommit_client = self._get_precommit_client(self._get_changed_file(), self._get_no_deleted_files())
+        self.precommit_client.deadline = 0.1
+        responses.add(responses.PUT, PrecommitClientTest.get_project_service_mock('pre-commit'), body=SUCCESS,
+                      status=200)
+        responses.add(responses.GET, PrecommitClientTest.get_project_service_mock('pre-commit'), status=204)
+
+        with self.assertRaises(SystemExit) as context:
+            self.precommit_client.run()
+
+        self.assertEqual(context.exception.code, EXIT_CODE_DEADLINE_EXCEEDED)
+
+    @responses.activate
+    def test_hook_fails_on_red_findings(self):
+        """Tests that in hook mode, the client fails on RED findings and gives up after the default deadline."""
+        self.precommit_client = self._get_hook_precommit_client()
+        self.mock_precommit_findings_churn(added_findings=[1])
+        sys.stdout = StringIO()
+
+        with self.assertRaises(SystemExit) as context:
+            self.precommit_client.run()
+
+        self.assertTrue(self.precommit_client.hook_mode)
+        self.assertEqual(self.precommit_client.deadline, DEFAULT_HOOK_DEADLINE_IN_SECONDS)
+        self.assertEqual(context.exception.code, 1)
+
+    @responses.activate
+    def test_hook_polls_for_results_at_short_intervals(self):
+        """Tests that in hook mode, the client waits only briefly before and between polls for precommit results."""
+        self.precommit_client = self._get_hook_precommit_client()
+        responses.add(responses.GET, PrecommitClientTest.get_project_service_mock('pre-commit'), status=204)
+        self.mock_precommit_findings_churn()
+        self.precommit_client.teamscale_client.wait = Mock()
+        sys.stdout = StringIO()
+
+        self.precommit_client.run()
+
+        self.assertEqual(self.precommit_client.teamscale_client.wait.call_args_list,
+                         [call(PrecommitClient.HOOK_PRECOMMIT_WAITING_TIME_IN_SECONDS)] * 2)
+
+    @responses.activate
+    def test_hook_does_not_block_commit_when_deadline_passes(self):
+        """Tests that in hook mode, the client exits successfully once the deadline has passed."""
+        self.precommit_client = self._get_hook_precommit_client('--deadline', '0.1')
+        responses.add(responses.PUT, PrecommitClientTest.get_project_service_mock('pre-commit'), body=SUCCESS,
+                      status=200)
+        responses.add(responses.GET, PrecommitClientTest.get_project_service_mock('pre-commit'), status=204)
+        sys.stdout = StringIO()
+        sys.stderr = StringIO()
+        self.addCleanup(setattr, sys, 'stderr', sys.__stderr__)
+
+        with self.assertRaises(SystemExit) as context:
+            self.precommit_client.run()
+
+        self.assertEqual(self.precommit_client.result.status, PrecommitResult.STATUS_DEADLINE_EXCEEDED)
+        self.assertEqual(context.exception.code, 0)
+
+    @responses.activate
+    def test_only_print_findings_changed_since_last_run(self):
+        """Tests that a second run only prints the findings that are new or resolved since the first run."""
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir)
+
+        self._run_with_only_changed_findings(state_dir, existing_findings=[3, 4])
+        captured_output = self._run_with_only_changed_findings(state_dir, existing_findings=[4, 5])
+
+        output_lines = captured_output.getvalue().splitlines()
+        self.assertIn('> Resolved: %s:3: message3' % ANALYZED_FILE_PATH, output_lines)
+        self.assertIn('%s:5:1: error: message5' % ANALYZED_FILE_PATH, output_lines)
+        self.assertNotIn('%s:4:1: error: message4' % ANALYZED_FILE_PATH, output_lines)
+        self.assertIn('> 1 new, 1 resolved, 1 unchanged since last run.', output_lines)
+
+    @responses.activate
+    def test_reuse_cached_findings_of_revision_without_requests(self):
+        """Tests that a second run for the same revision takes the existing findings and the commit of the revision
+        from the response cache without sending any request to the project services."""
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir)
+        self._run_with_response_cache(state_dir, existing_findings=[3, 4])
+        responses.reset()
+        self._run_with_response_cache(state_dir)
+
+        project_requests = [call for call in responses.calls if '/p/%s/' % PROJECT in call.request.url]
+        self.assertEqual(project_requests, [])
+        self.assert_findings_ids(self.precommit_client.existing_findings, [3, 4])
+        response_cache = self.precommit_client.teamscale_client.response_cache
+        self.assertEqual((response_cache.hits, response_cache.misses), (2, 0))
+
+    @responses.activate
+    def test_stop_when_superseded_by_newer_run(self):
+        """Tests that a run stops waiting for precommit results and prints no findings once a newer run starts in the
+        same repository."""
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir)
+        self.precommit_client = self._get_precommit_client(self._get_changed_file(), self._get_no_deleted_files())
+        self.precommit_client.supersede_previous_runs = True
+        self.precommit_client._get_client_state_dir = Mock(return_value=state_dir)
+
+        def start_newer_run(request):
+            RunCoordinator.for_repository(state_dir).register()
+            return 204, {}, ''
+
+        responses.add(responses.PUT, PrecommitClientTest.get_project_service_mock('pre-commit'), body=SUCCESS,
+                      status=200)
+        responses.add_callback(responses.GET, PrecommitClientTest.get_project_service_mock('pre-commit'),
+                               callback=start_newer_run)
+
+        captured_output = StringIO()
+        sys.stdout = captured_output
+        with self.assertRaises(SystemExit) as context:
+            self.precommit_client.run()
+
+        self.assertEqual(context.exception.code, 0)
+        self.assertEqual(len([call for call in responses.calls if 'pre-commit' in call.request.url]), 2)
+        self.assertNotIn('New findings:', captured_output.getvalue())
+
+    @responses.activate
+    def test_answer_existing_findings_from_synced_mirror(self):
+        """Tests that a first run fills the findings mirror and a second run for the same commit takes the existing
+        findings from the mirror instead of the server."""
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir)
+
+        self._run_with_findings_mirror(state_dir)
+        self.assert_findings_ids(self.precommit_client.existing_findings, [3, 4])
+        self.assertFalse(self.precommit_client.findings_mirror_is_fresh)
+
+        self._run_with_findings_mirror(state_dir)
+        self.assert_findings_ids(self.precommit_client.existing_findings, [3, 4])
+        self.assertTrue(self.precommit_client.findings_mirror_is_fresh)
+        self.assertEqual(len([call for call in responses.calls if 'findings' in call.request.url]), 0)
+
+    @responses.activate
+    def test_look_up_mirrored_findings_with_slash_separated_paths(self):
+        """Tests that paths with Windows separators are looked up in the findings mirror with '/' separators."""
+        self.precommit_client = self._get_precommit_client(self._get_no_changed_files(), self._get_no_deleted_files())
+        self.precommit_client.findings_mirror = Mock()
+
+        with patch('os.sep', '\\'):
+            self.precommit_client._get_mirrored_findings('prefix/src\\sub\\..\\file.ext')
+            self.precommit_client._get_mirrored_findings('.\\')
+
+        self.assertEqual([call[0][1] for call in self.precommit_client.findings_mirror.get_findings.call_args_list],
+                         ['prefix/src/file.ext', ''])
+
+    @responses.activate
+    def test_start_findings_mirror_sync_once_without_waiting(self):
+        """Tests that the findings mirror is filled by a single detached process that runs are not waiting for."""
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir)
+
+        with patch('teamscale_precommit_client.precommit_client._spawn_findings_mirror_sync') as spawn:
+            self._run_with_findings_mirror(state_dir, sync=False)
+            self._run_with_findings_mirror(state_dir, sync=False)
+
+        self.assertEqual(spawn.call_count, 1)
+        job = spawn.call_args[0][0]
+        self.assertEqual((job['branch'], job['commit'], job['access_token']), (CURRENT_BRANCH, REVISION, ACCESS_TOKEN))
+        self.assert_findings_ids(self.precommit_client.existing_findings, [3, 4])
+        self.assertFalse(self.precommit_client.findings_mirror_is_fresh)
+
+    @responses.activate
+    def test_analyze_returns_results_without_printing_or_exiting(self):
+        """Tests that the library API returns the findings and upload statistics instead of printing them, and that it
+        can be called repeatedly."""
+        self.precommit_client = self._get_precommit_client(self._get_changed_file(), self._get_no_deleted_files(),
+                                                           fetch_existing_findings=True)
+        self.precommit_client.fail_on_red_findings = True
+        self.mock_precommit_findings_churn(added_findings=[2, 1])
+        self.mock_existing_findings(self.precommit_client._get_precommit_branch(), existing_findings=[1, 2, 4])
+        captured_output = StringIO()
+        sys.stdout = captured_output
+
+        for _ in range(2):
+            result = self.precommit_client.analyze()
+
+            self.assertEqual(result.status, PrecommitResult.STATUS_COMPLETED)
+            self.assertEqual(result.exit_code, 1)
+            self.assertEqual(list(result.findings.keys()),
+                             ['New findings:', 'Findings in changed code:', 'Existing findings:'])
+            self.assert_findings_ids(result.findings['New findings:'], [1, 2])
+            self.assert_findings_ids(result.findings['Existing findings:'], [4])
+            self.assertEqual((result.uploaded_files, result.deleted_files), (1, 0))
+            self.assertEqual(result.uploaded_bytes, len(self._get_changed_file()[ANALYZED_FILE_NAME]))
+            self.assertIn('precommit analysis', result.timings)
+        self.assertEqual(captured_output.getvalue(), '')
+
+    @responses.activate
+    def test_analyze_returns_skipped_files_without_printing(self):
+        """Tests that the library API returns the changed files that could not be analyzed instead of printing them."""
+        repo_dir = self._create_repo_with_badly_encoded_change()
+        self.precommit_client = self._get_precommit_client(self._get_changed_file(), self._get_no_deleted_files())
+        del self.precommit_client._calculate_modifications
+        self.precommit_client.repository_path = repo_dir
+        self.precommit_client.file_encoding = 'utf-8'
+        self.mock_precommit_findings_churn(added_findings=[1])
+        captured_output = StringIO()
+        sys.stdout = captured_output
+
+        result = self.precommit_client.analyze()
+
+        self.assertEqual(list(result.skipped_files), ['binary.png'])
+        self.assertIn('not encoded in utf-8', result.skipped_files['binary.png'])
+        self.assertEqual(result.uploaded_files, 1)
+        self.assertEqual(captured_output.getvalue(), '')
+
+    @responses.activate
+    def test_print_findings_as_json_lines(self):
+        """Tests that in JSON Lines format, stdout only contains one JSON object per finding."""
+        self.precommit_client = self._get_precommit_client(self._get_changed_file(), self._get_no_deleted_files(),
+                                                           fetch_existing_findings=True)
+        self.precommit_client.output_format = OUTPUT_FORMAT_JSONL
+        self.mock_precommit_findings_churn(added_findings=[1])
+        self.mock_existing_findings(self.precommit_client._get_precommit_branch(), existing_findings=[1, 4])
+        captured_output = StringIO()
+        sys.stdout = captured_output
+        sys.stderr = StringIO()
+        self.addCleanup(setattr, sys, 'stderr', sys.__stderr__)
+
+        self.precommit_client.run()
+
+        findings = [json.loads(line) for line in captured_output.getvalue().splitlines()]
+        self.assertEqual(findings, [
+            {'path': ANALYZED_FILE_PATH, 'line': 1, 'assessment': 'RED', 'message': 'message1', 'findingId': '1',
+             'section': 'New findings', 'link': None},
+            {'path': ANALYZED_FILE_PATH, 'line': 4, 'assessment': 'RED', 'message': 'message4', 'findingId': '4',
+             'section': 'Existing findings', 'link': None}])
+
+    @responses.activate
+    def test_print_skipped_files_to_stderr_in_json_lines_format(self):
+        """Tests that in JSON Lines format, warnings about changed files that cannot be analyzed go to stderr."""
+        repo_dir = self._create_repo_with_badly_encoded_change()
+        self.precommit_client = self._get_precommit_client(self._get_changed_file(), self._get_no_deleted_files())
+        del self.precommit_client._calculate_modifications
+        self.precommit_client.repository_path = repo_dir
+        self.precommit_client.file_encoding = 'utf-8'
+        self.precommit_client.output_format = OUTPUT_FORMAT_JSONL
+        self.mock_precommit_findings_churn(added_findings=[1])
+        captured_output = StringIO()
+        sys.stdout = captured_output
+        captured_errors = StringIO()
+        sys.stderr = captured_errors
+        self.addCleanup(setattr, sys, 'stderr', sys.__stderr__)
+
+        self.precommit_client.run()
+
+        self.assertEqual(list(self.precommit_client.changed_files), [ANALYZED_FILE_NAME])
+        self.assertEqual([json.loads(line)['findingId'] for line in captured_output.getvalue().splitlines()], ['1'])
+        self.assertIn('File at binary.png is not encoded in utf-8.', captured_errors.getvalue())
+
+    @responses.activate
+    def test_get_existing_findings_in_several_files(self):
+        """Tests that the existing findings in several analyzed files are fetched and printed grouped by file."""
+        other_file_name = 'other.ext'
+        self.precommit_client = self._get_precommit_client(self._get_no_changed_files(), self._get_no_deleted_files(),
+                                                           fetch_existing_findings=True)
+        self.precommit_client.analyzed_files = [ANALYZED_FILE_PATH, REPO_PATH + other_file_name]
+        responses.add(responses.GET,
+                      PrecommitClientTest.get_project_service_mock('repository-timestamp-by-revision', REVISION),
+                      body=to_json([{'branchName': CURRENT_BRANCH, 'timestamp': 'HEAD'}]), status=200,
+                      content_type='application/json')
+
+        def get_findings_in_requested_file(request):
+            finding = PrecommitClientTest._get_findings_as_dicts([1], DEFAULT_PATH_PREFIX)[0]
+            if other_file_name in request.url:
+                finding.update(id='2', message='message2', location={'uniformPath': other_file_name})
+            return 200, {}, to_json([finding])
+
+        responses.add_callback(responses.GET, PrecommitClientTest.get_project_service_mock('findings'),
+                               callback=get_findings_in_requested_file, content_type='application/json')
+        captured_output = StringIO()
+        sys.stdout = captured_output
+
+        self.precommit_client.run()
+
+        self.assert_findings_ids(self.precommit_client.existing_findings, [1, 2])
+        output_lines = captured_output.getvalue().splitlines()
+        self.assertEqual(output_lines.index('Existing findings in %s:' % other_file_name),
+                         output_lines.index('%s:1:1: error: message1' % ANALYZED_FILE_PATH) + 2)
+        self.assertIn('%s%s:1:1: error: message2' % (REPO_PATH, other_file_name), output_lines)
+        self.assertEqual(len([call for call in responses.calls if 'repository-timestamp' in call.request.url]), 1)
+
+    @responses.activate
+    def test_replay_recorded_run_without_server_or_repository(self):
+        """Tests that a recorded run is replayed with the recorded git snapshot and without contacting the server."""
+        recording_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, recording_dir)
+        recording_file = os.path.join(recording_dir, 'recording.json')
+        self.precommit_client = self._get_precommit_client(self._get_changed_file(), [DELETED_FILE_NAME],
+                                                           record_file=recording_file)
+        self.mock_precommit_findings_churn(added_findings=[1, 2])
+        recorded_result = self.precommit_client.analyze()
+        responses.reset()
+
+        replaying_client = PrecommitClient(self._get_precommit_client_config(), repository_path=REPO_PATH,
+                                           analyzed_file=ANALYZED_FILE_PATH, verify=False, omit_links_to_findings=True,
+                                           replay_file=recording_file, replay_latency_scale=0)
+        replayed_result = replaying_client.analyze()
+
+        self.assertEqual(len(responses.calls), 0)
+        self.assertEqual(replaying_client.current_branch, CURRENT_BRANCH)
+        self.assertEqual(replaying_client.deleted_files, [DELETED_FILE_NAME])
+        self.assertEqual(replayed_result.uploaded_bytes, recorded_result.uploaded_bytes)
+        self.assert_findings_ids(replaying_client.added_findings, [1, 2])
+
+    def _create_repo_with_badly_encoded_change(self):
+        """Creates a git repository in which the analyzed file is changed and a binary file is added."""
+        repo_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, repo_dir, ignore_errors=True)
+        repo = Repo.init(repo_dir)
+        with repo.config_writer() as config:
+            config.set_value('user', 'name', 'John Doe')
+            config.set_value('user', 'email', 'john@example.com')
+        with open(os.path.join(repo_dir, ANALYZED_FILE_NAME), 'w') as analyzed_file:
+            analyzed_file.write('old\n')
+        repo.index.add([ANALYZED_FILE_NAME])
+        repo.index.commit('Initial commit')
+
+        with open(os.path.join(repo_dir, ANALYZED_FILE_NAME), 'w') as analyzed_file:
+            analyzed_file.write('new\n')
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'binary.png'), repo_dir)
+        repo.index.add(['binary.png'])
+        return repo_dir
+
+    def _run_with_findings_mirror(self, state_dir, sync=True):
+        """Runs the client for existing findings without changes, using the findings mirror in the given directory.
+        Unless disabled, the mirror is synced in this process instead of a detached one."""
+        self.precommit_client = self._get_precommit_client(self._get_no_changed_files(), self._get_no_deleted_files(),
+                                                           fetch_existing_findings=True)
+        self.precommit_client.use_findings_mirror = True
+        self.precommit_client._get_client_state_dir = Mock(return_value=state_dir)
+        responses.reset()
+        responses.add(responses.GET, PrecommitClientTest.get_global_service_mock('service-api-info'), status=200,
+                      content_type="application/json", body='{"apiVersion": 6}')
+        self.mock_existing_findings(CURRENT_BRANCH, existing_findings=[3, 4])
+        sys.stdout = StringIO()
+        if sync:
+            with patch('teamscale_precommit_client.precommit_client._spawn_findings_mirror_sync',
+                       side_effect=_sync_findings_mirror):
+                self.precommit_client.run()
+        else:
+            self.precommit_client.run()
+
+    def _run_with_response_cache(self, state_dir, existing_findings=None):
+        """Runs the client for existing findings without changes, caching responses in the given state directory. The
+        server only answers the findings requests if existing findings are given."""
+        self.precommit_client = self._get_precommit_client(self._get_no_changed_files(), self._get_no_deleted_files(),
+                                                           fetch_existing_findings=True)
+        self.precommit_client.use_response_cache = True
+        self.precommit_client._get_client_state_dir = Mock(return_value=state_dir)
+        if existing_findings is not None:
+            self.mock_existing_findings(CURRENT_BRANCH, existing_findings=existing_findings)
+        sys.stdout = StringIO()
+        self.precommit_client.run()
+
+    def _run_with_only_changed_findings(self, state_dir, existing_findings):
+        """Runs the client for existing findings without changes, printing only findings changed since the last run.
+        Returns the captured output."""
+        self.precommit_client = self._get_precommit_client(self._get_no_changed_files(), self._get_no_deleted_files(),
+                                                           fetch_existing_findings=True)
+        self.precommit_client.only_changed_findings = True
+        self.precommit_client._get_client_state_dir = Mock(return_value=state_dir)
+        responses.reset()
+        self.mock_existing_findings(CURRENT_BRANCH, existing_findings=existing_findings)
+
+        captured_output = StringIO()
+        sys.stdout = captured_output
+        self.precommit_client.run()
+        return captured_output
+
     @staticmethod
     def mock_precommit_findings_churn(added_findings=None, findings_in_changed_code=None, removed_findings=None,
                                       path_prefix=DEFAULT_PATH_PREFIX):
@@ -293,7 +710,7 @@ class PrecommitClientTest(TestCase):
     @staticmethod
     def _get_precommit_client(changed_files, deleted_files, path_prefix=DEFAULT_PATH_PREFIX,
                               project_subpath=DEFAULT_PROJECT_SUBPATH, fetch_existing_findings=False,
-                              fetch_existing_findings_in_changes=False, fetch_all_findings=False):
+                              fetch_existing_findings_in_changes=False, fetch_all_findings=False, record_file=None):
         """Gets a precommit client some of whose methods are mocked out for testing."""
         responses.add(responses.GET, PrecommitClientTest.get_global_service_mock('service-api-info'), status=200,
                       content_type="application/json", body='{"apiVersion": 6}')
@@ -303,7 +720,30 @@ class PrecommitClientTest(TestCase):
                                            verify=False, omit_links_to_findings=True,
                                            fetch_all_findings=fetch_all_findings,
                                            fetch_existing_findings=fetch_existing_findings,
-                                           fetch_existing_findings_in_changes=fetch_existing_findings_in_changes)
+                                           fetch_existing_findings_in_changes=fetch_existing_findings_in_changes,
+                                           record_file=record_file)
+        PrecommitClientTest._mock_repository_access(precommit_client, changed_files, deleted_files)
+        return precommit_client
+
+    @staticmethod
+    def _get_hook_precommit_client(*arguments):
+        """Gets a precommit client configured from the command line for hook mode, with the given further arguments.
+        Its repository access is mocked out like in `_get_precommit_client`."""
+        responses.add(responses.GET, PrecommitClientTest.get_global_service_mock('service-api-info'), status=200,
+                      content_type="application/json", body='{"apiVersion": 6}')
+        command_line = ['teamscale-cli', '--hook', '--omit-links-to-findings'] + list(arguments) + [ANALYZED_FILE_PATH]
+        with patch('sys.argv', command_line), \
+                patch('teamscale_precommit_client.precommit_client.get_repo_root_from_file_in_repo',
+                      return_value=REPO_PATH), \
+                patch('teamscale_precommit_client.precommit_client.get_teamscale_client_configuration',
+                      return_value=PrecommitClientTest._get_precommit_client_config()):
+            precommit_client = _configure_precommit_client(_parse_args())
+        PrecommitClientTest._mock_repository_access(precommit_client, PrecommitClientTest._get_changed_file(), [])
+        return precommit_client
+
+    @staticmethod
+    def _mock_repository_access(precommit_client, changed_files, deleted_files):
+        """Mocks out the methods of the given client that access the repository, reporting the given changes."""
         precommit_client._calculate_modifications = Mock()
         precommit_client.current_branch = CURRENT_BRANCH
         precommit_client._retrieve_current_branch = Mock()
@@ -314,8 +754,6 @@ class PrecommitClientTest(TestCase):
         PrecommitClient.PRECOMMIT_WAITING_TIME_IN_SECONDS = 0
         precommit_client._get_commit_hash = Mock(return_value=REVISION)
 
-        return precommit_client
-
     @staticmethod
     def _get_precommit_client_config():
         """Gets the precommit client config for the tests."""
@@ -0,0 +1,108 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+import requests
+import responses
+
+from teamscale_precommit_client.http_client import PrecommitTeamscaleClient
+from teamscale_precommit_client.recording import Recording, RecordingAdapter, ReplayAdapter, UnrecordedRequestError
+
+URL = 'http://localhost:8080'
+PROJECT = 'test_project'
+
+
+class RecordingTest(unittest.TestCase):
+    """ Unit tests for recording.py """
+
+    def setUp(self):
+        self.recording_dir = tempfile.mkdtemp()
+        self.recording_file = os.path.join(self.recording_dir, 'recording.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.recording_dir)
+
+    def test_replay_recorded_exchanges_without_network(self):
+        """ Test that a saved recording answers the recorded requests without contacting the server """
+        with responses.RequestsMock() as mocked_server:
+            self._add_api_info(mocked_server)
+            mocked_server.add(responses.GET, re.compile(r'%s/p/%s/findings/.*' % (URL, PROJECT)), status=200,
+                              body=self._get_findings_json(), content_type='application/json')
+            recording = Recording()
+            client = self._get_client(RecordingAdapter(recording))
+            recorded_findings = client.get_findings('file.ext', timestamp=None)
+        recording.manifest = {'commit': 'abc'}
+        recording.save(self.recording_file)
+
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as mocked_server:
+            replayed_recording = Recording.load(self.recording_file)
+            client = self._get_client(ReplayAdapter(replayed_recording, latency_scale=0))
+            replayed_findings = client.get_findings('file.ext', timestamp=None)
+            self.assertEqual(len(mocked_server.calls), 0)
+
+        self.assertEqual(replayed_recording.manifest, {'commit': 'abc'})
+        self.assertEqual([finding.uniformPath for finding in replayed_findings],
+                         [finding.uniformPath for finding in recorded_findings])
+        self.assertEqual([len(finding.message) for finding in replayed_findings], [len('message')])
+
+    def test_anonymise_messages_keeping_their_length(self):
+        """ Test that finding messages are replaced by placeholders of the same length when recording """
+        with responses.RequestsMock() as mocked_server:
+            self._add_api_info(mocked_server)
+            mocked_server.add(responses.GET, re.compile(r'%s/p/%s/findings/.*' % (URL, PROJECT)), status=200,
+                              body=self._get_findings_json(), content_type='application/json')
+            recording = Recording()
+            client = self._get_client(RecordingAdapter(recording))
+            client.get_findings('file.ext', timestamp=None)
+
+        findings_exchange = [exchange for exchange in recording.exchanges if '/findings/' in exchange['request']][0]
+        finding = json.loads(findings_exchange['body'])[0]
+        self.assertEqual(finding['message'], 'xxxxxxx')
+        self.assertEqual(finding['location']['uniformPath'], 'file.ext')
+        self.assertGreaterEqual(findings_exchange['latency'], 0)
+
+    def test_replay_identical_requests_in_order(self):
+        """ Test that repeated requests receive the recorded responses in order, repeating the last one """
+        recording = Recording([self._get_exchange('GET /poll?a=1&b=2', 204, ''),
+                               self._get_exchange('GET /poll?a=1&b=2', 200, 'done')])
+        adapter = ReplayAdapter(recording, latency_scale=0)
+
+        with responses.RequestsMock(assert_all_requests_are_fired=False):
+            session = self._get_session(adapter)
+            self.assertEqual(session.get(URL + '/poll?b=2&a=1').status_code, 204)
+            self.assertEqual(session.get(URL + '/poll?a=1&b=2').text, 'done')
+            self.assertEqual(session.get(URL + '/poll?a=1&b=2').text, 'done')
+            with self.assertRaises(UnrecordedRequestError):
+                session.get(URL + '/other')
+
+    @staticmethod
+    def _get_exchange(request, status, body):
+        """ Returns a recorded exchange without latency """
+        return {'request': request, 'request_size': 0, 'status': status, 'headers': {}, 'body': body, 'latency': 0}
+
+    @staticmethod
+    def _get_session(adapter):
+        """ Returns a session sending all requests through the given adapter """
+        session = requests.Session()
+        session.mount('http://', adapter)
+        return session
+
+    @staticmethod
+    def _add_api_info(mocked_server):
+        """ Makes the mocked server answer the API version check of the client """
+        mocked_server.add(responses.GET, re.compile(r'%s/service-api-info/.*' % URL), status=200,
+                          content_type='application/json', body='{"apiVersion": 6}')
+
+    @staticmethod
+    def _get_findings_json():
+        """ Returns the JSON representation of a single finding """
+        return ('[{"id": "1", "typeId": "type", "message": "message", "assessment": "RED", '
+                '"location": {"uniformPath": "file.ext", "rawStartLine": 1, "rawEndLine": 1}}]')
+
+    @staticmethod
+    def _get_client(transport_adapter):
+        """ Returns a client sending its requests through the given adapter """
+        return PrecommitTeamscaleClient(URL, 'johndoe', 'secret', PROJECT, transport_adapter=transport_adapter)
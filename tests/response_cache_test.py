@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import requests
+
+from teamscale_precommit_client.response_cache import ResponseCache
+
+
+class ResponseCacheTest(unittest.TestCase):
+    """ Unit tests for response_cache.py """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_only_store_revalidatable_or_immutable_responses(self):
+        """ Test that responses without validators are only stored if they are immutable """
+        cache = ResponseCache(self.cache_dir)
+        cache.store('plain', self._get_response(b'[]'))
+        cache.store('immutable', self._get_response(b'[1]'), immutable=True)
+        cache.store('etag', self._get_response(b'[2]', {'ETag': '"v1"'}))
+        cache.store('failed', self._get_response(b'error', {'ETag': '"v1"'}, status_code=500))
+
+        self.assertIsNone(cache.lookup('plain'))
+        self.assertIsNone(cache.lookup('failed'))
+        self.assertTrue(cache.lookup('immutable').immutable)
+        self.assertEqual(cache.lookup('etag').get_validators(), {'If-None-Match': '"v1"'})
+        self.assertEqual(cache.lookup('etag').to_response('url').json(), [2])
+
+    def test_evict_least_recently_used_entries(self):
+        """ Test that the least recently used entries are evicted once the cache exceeds its size """
+        cache = ResponseCache(self.cache_dir, max_size_in_bytes=10 ** 6)
+        for key in ['a', 'b', 'c']:
+            cache.store(key, self._get_response(b'0' * 1000), immutable=True)
+        entry_size = os.path.getsize(os.path.join(self.cache_dir, 'a'))
+        past = time.time() - 100
+        os.utime(os.path.join(self.cache_dir, 'a'), (past, past))
+        os.utime(os.path.join(self.cache_dir, 'b'), (past - 10, past - 10))
+        os.utime(os.path.join(self.cache_dir, 'c'), (past, past))
+        # Touches 'a', so that 'c' is used less recently
+        cache.lookup('a')
+
+        cache.max_size_in_bytes = 2 * entry_size
+        cache.store('d', self._get_response(b'0' * 1000), immutable=True)
+
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['a', 'd'])
+
+    def test_hit_rate(self):
+        """ Test that the hit rate counts all hits, including revalidated ones """
+        cache = ResponseCache(self.cache_dir)
+        self.assertIsNone(cache.get_hit_rate())
+
+        cache.record_hit()
+        cache.record_hit(revalidated=True)
+        cache.record_hit()
+        cache.record_miss()
+
+        self.assertEqual(cache.get_hit_rate(), 0.75)
+        self.assertEqual(cache.revalidated_hits, 1)
+
+    @staticmethod
+    def _get_response(content, headers=None, status_code=200):
+        """ Returns a response with the given body and headers """
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = content
+        response.headers.update(headers or {})
+        return response
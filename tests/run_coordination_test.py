@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from teamscale_precommit_client.run_coordination import RunCoordinator, RunSupersededError
+
+
+class RunCoordinatorTest(unittest.TestCase):
+    """ Unit tests for run_coordination.py """
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.state_dir)
+
+    def test_newer_run_supersedes_earlier_runs(self):
+        """ Test that only runs registered before the newest one are superseded """
+        earlier_run = RunCoordinator.for_repository(self.state_dir)
+        earlier_run.register()
+        self.assertFalse(earlier_run.is_superseded())
+
+        newer_run = RunCoordinator.for_repository(self.state_dir)
+        newer_run.register()
+        self.assertFalse(newer_run.is_superseded())
+        with self.assertRaises(RunSupersededError):
+            earlier_run.check()
+
+    def test_retry_replacing_run_file_opened_by_another_run(self):
+        """ Test that registering retries replacing the run file while another run has it open (as on Windows) """
+        run = RunCoordinator.for_repository(self.state_dir)
+        original_replace = os.replace
+        failures = [PermissionError(), PermissionError()]
+
+        def replace_after_failures(source, destination):
+            if failures:
+                raise failures.pop()
+            original_replace(source, destination)
+
+        with patch('os.replace', side_effect=replace_after_failures):
+            run.register()
+
+        self.assertFalse(run.is_superseded())
+        self.assertEqual(os.listdir(self.state_dir), [os.path.basename(run.run_file)])